@@ -40,7 +40,7 @@ create table _albion.metadata(
     version varchar)
 ;
 
-insert into _albion.metadata(srid, version) select $SRID, '2.3'
+insert into _albion.metadata(srid, version) select $SRID, '2.4'
 ;
 
 create table _albion.layer(
@@ -129,13 +129,28 @@ create table _albion.cell(
     a varchar not null references _albion.hole(id) on delete cascade on update cascade,
     b varchar not null references _albion.hole(id) on delete cascade on update cascade,
     c varchar not null references _albion.hole(id) on delete cascade on update cascade,
-    geom geometry('POLYGON', $SRID) not null check(st_isvalid(geom) and st_numpoints(geom)=4)
+    geom geometry('POLYGON', $SRID) not null check(st_isvalid(geom) and st_numpoints(geom)=4),
+    -- quality of the cell, set by a trigger (albion.cell_quality_fct)
+    aspect_ratio real,
+    area real,
+    min_angle real,
+    min_edge_length real,
+    max_edge_length real
 )
 ;
 
 create index cell_geom_idx on _albion.cell using gist(geom)
 ;
 
+create index cell_aspect_ratio_idx on _albion.cell(aspect_ratio)
+;
+
+create index cell_area_idx on _albion.cell(area)
+;
+
+create index cell_min_angle_idx on _albion.cell(min_angle)
+;
+
 create index volume_cell_a_idx on _albion.cell(a)
 ;
 
@@ -162,16 +177,30 @@ create table _albion.volume(
     id varchar primary key default _albion.unique_id()::varchar,
     graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
     cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
-    triangulation geometry('MULTIPOLYGONZ', $SRID) not null,
+    -- triangles of the volume as a packed mesh (see albion.to_mesh),
+    -- albion.volume derives the triangulation geometry from it
+    mesh bytea not null,
     face1 geometry('MULTIPOLYGONZ', $SRID),
     face2 geometry('MULTIPOLYGONZ', $SRID),
-    face3 geometry('MULTIPOLYGONZ', $SRID)
+    face3 geometry('MULTIPOLYGONZ', $SRID),
+    -- metrics of the mesh, set by a trigger
+    closed boolean,
+    volume real,
+    triangle_count integer,
+    bbox box3d
 )
 ;
 
 create index volume_graph_id_idx on _albion.volume(graph_id)
 ;
 
+create index volume_closed_idx on _albion.volume(graph_id, closed, volume)
+;
+
+-- box3d has no index support, bounding box searches use bbox::geometry &&&
+create index volume_bbox_idx on _albion.volume using gist((bbox::geometry) gist_geometry_ops_nd)
+;
+
 create index volume_cell_id_idx on _albion.volume(cell_id)
 ;
 
@@ -202,6 +231,9 @@ create table _albion.end_node(
 create index end_node_geom_idx on _albion.end_node using gist(geom)
 ;
 
+create index end_node_node_id_idx on _albion.end_node(node_id)
+;
+
 create table _albion.named_section(
     id varchar primary key default _albion.unique_id()::varchar,
     geom geometry('LINESTRING', $SRID) not null,
@@ -218,6 +250,103 @@ create table _albion.vertical_face(
     triangulation geometry('MULTIPOLYGONZ', $SRID) not null
 );
 
+-- cells whose volume must be recomputed after a change of node, edge or end node
+create table _albion.dirty_cell(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    primary key (graph_id, cell_id)
+)
+;
+
+create index dirty_cell_cell_id_idx on _albion.dirty_cell(cell_id)
+;
+
+-- statistics of the last volume build of each cell, recorded when the setting
+-- albion.volume_stats is 'on' (times in seconds)
+create table _albion.volume_stats(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    node_count integer,
+    edge_count integer,
+    end_node_count integer,
+    volume_count integer,
+    open_volume_count integer,
+    triangle_count integer,
+    parse_time real,
+    face_time real,
+    tessellation_time real,
+    closing_time real,
+    component_time real,
+    total_time real,
+    created timestamp default now(),
+    primary key (graph_id, cell_id)
+)
+;
+
+create index volume_stats_cell_id_idx on _albion.volume_stats(cell_id)
+;
+
+-- volumes built by albion.elementary_volumes (as arrays, possibly empty) by
+-- hash of their inputs (see albion.elementary_volume_input)
+create table _albion.volume_cache(
+    input_hash varchar primary key,
+    meshes bytea[] not null,
+    face1s geometry[] not null,
+    face2s geometry[] not null,
+    face3s geometry[] not null
+)
+;
 
+-- inputs of the volumes of the cells of each graph, cached volumes are
+-- evicted when they are not used anymore
+create table _albion.volume_cache_use(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    input_hash varchar not null,
+    primary key (graph_id, cell_id)
+)
+;
 
+create index volume_cache_use_cell_id_idx on _albion.volume_cache_use(cell_id)
+;
+
+create index volume_cache_use_input_hash_idx on _albion.volume_cache_use(input_hash)
+;
 
+-- nodes, edges and end nodes of each graph grouped by hole (by pair of holes
+-- for edges and end nodes) to assemble the inputs of elementary volumes,
+-- arrays are ordered by id, maintained by triggers
+create table _albion.hole_node(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    geoms geometry[] not null,
+    primary key (graph_id, hole_id)
+)
+;
+
+create table _albion.hole_pair_edge(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    hole_a varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    hole_b varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    starts varchar[] not null,
+    ends varchar[] not null,
+    primary key (graph_id, hole_a, hole_b),
+    check (hole_a <= hole_b)
+)
+;
+
+create index hole_pair_edge_hole_b_idx on _albion.hole_pair_edge(graph_id, hole_b)
+;
+
+create table _albion.hole_pair_end_node(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    node_hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    node_ids varchar[] not null,
+    geoms geometry[] not null,
+    primary key (graph_id, node_hole_id, hole_id)
+)
+;
@@ -0,0 +1,186 @@
+-- upgrade of _albion schema from version 2.3 to 2.4
+-- statements must be idempotent since projects upgraded from v1 are still flagged 2.0
+
+create table if not exists _albion.dirty_cell(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    primary key (graph_id, cell_id)
+)
+;
+
+create index if not exists dirty_cell_cell_id_idx on _albion.dirty_cell(cell_id)
+;
+
+-- statistics of the last volume build of each cell, recorded when the setting
+-- albion.volume_stats is 'on' (times in seconds)
+create table if not exists _albion.volume_stats(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    node_count integer,
+    edge_count integer,
+    end_node_count integer,
+    volume_count integer,
+    open_volume_count integer,
+    triangle_count integer,
+    parse_time real,
+    face_time real,
+    tessellation_time real,
+    closing_time real,
+    component_time real,
+    total_time real,
+    created timestamp default now(),
+    primary key (graph_id, cell_id)
+)
+;
+
+create index if not exists volume_stats_cell_id_idx on _albion.volume_stats(cell_id)
+;
+
+-- volumes built by albion.elementary_volumes (as arrays, possibly empty) by
+-- hash of their inputs (see albion.elementary_volume_input)
+create table if not exists _albion.volume_cache(
+    input_hash varchar primary key,
+    meshes bytea[] not null,
+    face1s geometry[] not null,
+    face2s geometry[] not null,
+    face3s geometry[] not null
+)
+;
+
+-- inputs of the volumes of the cells of each graph, cached volumes are
+-- evicted when they are not used anymore
+create table if not exists _albion.volume_cache_use(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    cell_id varchar not null references _albion.cell(id) on delete cascade on update cascade,
+    input_hash varchar not null,
+    primary key (graph_id, cell_id)
+)
+;
+
+create index if not exists volume_cache_use_cell_id_idx on _albion.volume_cache_use(cell_id)
+;
+
+create index if not exists volume_cache_use_input_hash_idx on _albion.volume_cache_use(input_hash)
+;
+
+-- metrics of volumes are filled when the albion schema is loaded
+alter table _albion.volume add column if not exists closed boolean
+;
+
+alter table _albion.volume add column if not exists volume real
+;
+
+alter table _albion.volume add column if not exists triangle_count integer
+;
+
+alter table _albion.volume add column if not exists bbox box3d
+;
+
+-- volumes are stored as packed meshes (see albion.to_mesh), the albion
+-- functions are not loaded yet, the triangulations are packed by a temporary
+-- function, views of the old albion schema that use triangulation are dropped
+-- with it (the schema is reloaded after the upgrade)
+alter table _albion.volume add column if not exists mesh bytea
+;
+
+create or replace function pg_temp.to_mesh(multipoly geometry)
+returns bytea
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        import types
+        module = types.ModuleType('elementary_volume')
+        exec($INCLUDE_ELEMENTARY_VOLUME, module.__dict__)
+        GD['elementary_volume'] = module
+    return GD['elementary_volume'].to_mesh(multipoly)
+$$
+;
+
+do
+$$
+    begin
+        if exists (select 1 from information_schema.columns
+                where table_schema='_albion' and table_name='volume' and column_name='triangulation') then
+            execute 'update _albion.volume set mesh=pg_temp.to_mesh(triangulation) where mesh is null';
+            execute 'alter table _albion.volume drop column triangulation cascade';
+        end if;
+    end;
+$$
+;
+
+alter table _albion.volume alter column mesh set not null
+;
+
+create index if not exists volume_closed_idx on _albion.volume(graph_id, closed, volume)
+;
+
+-- box3d has no index support, bounding box searches use bbox::geometry &&&
+create index if not exists volume_bbox_idx on _albion.volume using gist((bbox::geometry) gist_geometry_ops_nd)
+;
+
+create index if not exists end_node_node_id_idx on _albion.end_node(node_id)
+;
+
+-- nodes, edges and end nodes of each graph grouped by hole (by pair of holes
+-- for edges and end nodes) to assemble the inputs of elementary volumes,
+-- arrays are ordered by id, maintained by triggers
+create table if not exists _albion.hole_node(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    geoms geometry[] not null,
+    primary key (graph_id, hole_id)
+)
+;
+
+create table if not exists _albion.hole_pair_edge(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    hole_a varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    hole_b varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    starts varchar[] not null,
+    ends varchar[] not null,
+    primary key (graph_id, hole_a, hole_b),
+    check (hole_a <= hole_b)
+)
+;
+
+create index if not exists hole_pair_edge_hole_b_idx on _albion.hole_pair_edge(graph_id, hole_b)
+;
+
+create table if not exists _albion.hole_pair_end_node(
+    graph_id varchar not null references _albion.graph(id) on delete cascade on update cascade,
+    node_hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    hole_id varchar not null references _albion.hole(id) on delete cascade on update cascade,
+    ids varchar[] not null,
+    node_ids varchar[] not null,
+    geoms geometry[] not null,
+    primary key (graph_id, node_hole_id, hole_id)
+)
+;
+
+-- quality of the cells, set by a trigger (albion.cell_quality_fct)
+alter table _albion.cell add column if not exists aspect_ratio real
+;
+
+alter table _albion.cell add column if not exists area real
+;
+
+alter table _albion.cell add column if not exists min_angle real
+;
+
+alter table _albion.cell add column if not exists min_edge_length real
+;
+
+alter table _albion.cell add column if not exists max_edge_length real
+;
+
+create index if not exists cell_aspect_ratio_idx on _albion.cell(aspect_ratio)
+;
+
+create index if not exists cell_area_idx on _albion.cell(area)
+;
+
+create index if not exists cell_min_angle_idx on _albion.cell(min_angle)
+;
@@ -30,47 +30,20 @@ $$
 $$
 ;
 
-create or replace function albion.hole_geom(hole_id_ varchar)
+-- completes the desurveyed trajectory line_ of a hole (null if the hole has no deviation)
+-- with its collar, extends it down to depth_max_ if it's too short
+create or replace function albion.complete_hole_geom(hole_id_ varchar, line_ geometry, x_ double precision, y_ double precision, z_ double precision, depth_max_ real)
 returns geometry
-language plpgsql stable
+language plpgsql immutable
 as
 $$
     declare
-        depth_max_ real;
         hole_geom_ geometry;
-        x_ double precision;
-        y_ double precision;
-        z_ double precision;
         collar_geom_ geometry;
         path_ varchar;
     begin
-
-        select x, y, z, depth_ from _albion.hole where id=hole_id_ into x_, y_, z_, depth_max_;
         collar_geom_ := st_setsrid(st_makepoint(x_, y_, z_), $SRID);
-        with dz as (
-            select
-                from_ as md2, coalesce(lag(from_) over w, 0) as md1,
-                (dip + 90)*pi()/180 as wd2,  coalesce(lag((dip+90)*pi()/180) over w, 0) as wd1,
-                azimuth*pi()/180 as haz2,  coalesce(lag(azimuth*pi()/180) over w, 0) as haz1
-            from _albion.deviation
-            where azimuth >= 0 and azimuth <=360 and dip < 0 and dip > -180
-            and hole_id=hole_id_
-            window w AS (order by from_)
-        ),
-        pt as (
-            select md2, wd2, haz2,
-            x_ + sum(0.5 * (md2 - md1) * (sin(wd1) * sin(haz1) + sin(wd2) * sin(haz2))) over w as x,
-            y_ + sum(0.5 * (md2 - md1) * (sin(wd1) * cos(haz1) + sin(wd2) * cos(haz2))) over w as y,
-            z_ - sum(0.5 * (md2 - md1) * (cos(wd2) + cos(wd1))) over w as z
-            from dz
-            window w AS (order by md1)
-        ),
-        line as (
-            select st_makeline(('SRID=$SRID; POINTZ('||x||' '||y||' '||z||')')::geometry order by md2 asc) as geom
-            from pt
-        )
-        select ST_RemoveRepeatedPoints(st_addpoint(geom, collar_geom_, 0), 1.e-6)
-            from line as l
+        select ST_RemoveRepeatedPoints(st_addpoint(line_, collar_geom_, 0), 1.e-6)
         into hole_geom_;
 
         if hole_geom_ is not null and st_3dlength(hole_geom_) < depth_max_ and st_3dlength(hole_geom_) > 0 then
@@ -109,6 +82,48 @@ $$
 $$
 ;
 
+-- note that desurvey.py implements the same computation for all holes at once
+create or replace function albion.hole_geom(hole_id_ varchar)
+returns geometry
+language plpgsql stable
+as
+$$
+    declare
+        depth_max_ real;
+        line_ geometry;
+        x_ double precision;
+        y_ double precision;
+        z_ double precision;
+    begin
+
+        select x, y, z, depth_ from _albion.hole where id=hole_id_ into x_, y_, z_, depth_max_;
+        with dz as (
+            select
+                from_ as md2, coalesce(lag(from_) over w, 0) as md1,
+                (dip + 90)*pi()/180 as wd2,  coalesce(lag((dip+90)*pi()/180) over w, 0) as wd1,
+                azimuth*pi()/180 as haz2,  coalesce(lag(azimuth*pi()/180) over w, 0) as haz1
+            from _albion.deviation
+            where azimuth >= 0 and azimuth <=360 and dip < 0 and dip > -180
+            and hole_id=hole_id_
+            window w AS (order by from_)
+        ),
+        pt as (
+            select md2, wd2, haz2,
+            x_ + sum(0.5 * (md2 - md1) * (sin(wd1) * sin(haz1) + sin(wd2) * sin(haz2))) over w as x,
+            y_ + sum(0.5 * (md2 - md1) * (sin(wd1) * cos(haz1) + sin(wd2) * cos(haz2))) over w as y,
+            z_ - sum(0.5 * (md2 - md1) * (cos(wd2) + cos(wd1))) over w as z
+            from dz
+            window w AS (order by md1)
+        )
+        select st_makeline(('SRID=$SRID; POINTZ('||x||' '||y||' '||z||')')::geometry order by md2 asc)
+        from pt
+        into line_;
+
+        return albion.complete_hole_geom(hole_id_, line_, x_, y_, z_, depth_max_);
+    end;
+$$
+;
+
 create or replace function albion.hole_piece(from_ real, to_ real, hole_id_ varchar)
 returns geometry
 language plpgsql stable
@@ -237,7 +252,46 @@ select distinct on (a.id) a.id, a.geom from albion.collar as a, albion.collar as
 where a.id != b.id and st_dwithin(a.geom, b.geom, m.close_collar_distance)
 ;
 
-create view albion.cell as select id, a, b, c, geom::geometry('POLYGON', $SRID), albion.triangle_aspect_ratio(geom) as aspect_ratio from _albion.cell
+create or replace function albion.cell_quality_fct()
+returns trigger
+language plpgsql
+as
+$$
+    declare
+        ab float;
+        bc float;
+        ca float;
+    begin
+        ab := st_distance(st_pointn(st_exteriorring(new.geom), 1), st_pointn(st_exteriorring(new.geom), 2));
+        bc := st_distance(st_pointn(st_exteriorring(new.geom), 2), st_pointn(st_exteriorring(new.geom), 3));
+        ca := st_distance(st_pointn(st_exteriorring(new.geom), 3), st_pointn(st_exteriorring(new.geom), 1));
+        new.aspect_ratio := albion.triangle_aspect_ratio(new.geom);
+        new.area := st_area(new.geom);
+        new.min_edge_length := least(ab, bc, ca);
+        new.max_edge_length := greatest(ab, bc, ca);
+        -- the smallest angle (degrees) is opposite the shortest edge
+        new.min_angle := degrees(acos(greatest(-1, least(1,
+            (ab*ab + bc*bc + ca*ca - 2*new.min_edge_length^2)/(2*ab*bc*ca/new.min_edge_length)))));
+        return new;
+    end;
+$$
+;
+
+drop trigger if exists cell_quality_trig on _albion.cell
+;
+
+create trigger cell_quality_trig
+    before insert or update of geom on _albion.cell
+       for each row execute procedure albion.cell_quality_fct()
+;
+
+-- cells created before their quality was stored
+update _albion.cell set geom=geom where aspect_ratio is null
+;
+
+create view albion.cell as
+select id, a, b, c, geom::geometry('POLYGON', $SRID), aspect_ratio, area, min_angle, min_edge_length, max_edge_length
+from _albion.cell
 ;
 
 create or replace function albion.cell_after_fct()
@@ -246,7 +300,10 @@ language plpgsql
 as
 $$
     begin
-        refresh materialized view albion.all_edge;
+        -- albion.triangulate refreshes all_edge once the new cells are inserted
+        if current_setting('albion.defer_all_edge', true) is distinct from 'on' then
+            refresh materialized view albion.all_edge;
+        end if;
         return null;
     end;
 $$
@@ -281,31 +338,65 @@ $$
 $$
 ;
 
-create or replace function albion.triangulate()
-returns integer
+-- cells of the triangulation of the collars constrained by named section cuts,
+-- triangle vertices are collars, they are matched on their coordinates (hash
+-- join) rather than with a spatial query per vertex, collars sharing their
+-- coordinates would duplicate cells and are rejected
+create or replace function albion.tessellation()
+returns table(a varchar, b varchar, c varchar, geom geometry)
 language plpgsql volatile
 as
 $$
+    #variable_conflict use_column
+    declare
+        duplicates varchar;
     begin
-        delete from _albion.cell;
-        insert into _albion.cell(a, b, c, geom)
+        select string_agg(t.ids, '; ') into duplicates
+        from (
+            select string_agg(id, ', ' order by id) as ids
+            from albion.collar
+            group by st_x(geom), st_y(geom)
+            having count(1) > 1
+        ) as t;
+        if duplicates is not null then
+            raise exception 'collars with the same coordinates: %', duplicates;
+        end if;
+
+        return query
         with cell as (
             select albion.tesselate(
                 st_convexhull((select st_collect(st_force2d(geom)) from albion.collar)),
-                st_multi((select st_collectionhomogenize(st_collect(cut)) from albion.named_section)),
+                st_multi((select st_collectionhomogenize(st_collect(cut)) from _albion.named_section)),
                 st_multi((select st_collect(st_force2d(geom)) from albion.collar))
             ) as geom
         ),
         splt as (
-            select (ST_Dump(geom)).geom from cell
+            select geom, st_exteriorring(geom) as ring from (select (ST_Dump(geom)).geom from cell) as t
+        ),
+        collar as (
+            select id, st_x(geom) as x, st_y(geom) as y from albion.collar
         )
-        select
-            (select c.id from albion.collar as c where st_intersects(c.geom, st_pointn(st_exteriorring(s.geom), 1))),
-            (select c.id from albion.collar as c where st_intersects(c.geom, st_pointn(st_exteriorring(s.geom), 2))),
-            (select c.id from albion.collar as c where st_intersects(c.geom, st_pointn(st_exteriorring(s.geom), 3))),
-            s.geom
-        from splt as s;
+        select ca.id::varchar, cb.id::varchar, cc.id::varchar, s.geom
+        from splt as s
+        left join collar as ca on (ca.x, ca.y) = (st_x(st_pointn(s.ring, 1)), st_y(st_pointn(s.ring, 1)))
+        left join collar as cb on (cb.x, cb.y) = (st_x(st_pointn(s.ring, 2)), st_y(st_pointn(s.ring, 2)))
+        left join collar as cc on (cc.x, cc.y) = (st_x(st_pointn(s.ring, 3)), st_y(st_pointn(s.ring, 3)));
+    end;
+$$
+;
+
+create or replace function albion.triangulate()
+returns integer
+language plpgsql volatile
+as
+$$
+    begin
+        perform set_config('albion.defer_all_edge', 'on', true);
+        delete from _albion.cell;
+        insert into _albion.cell(a, b, c, geom)
+        select a, b, c, geom from albion.tessellation();
 
+        perform set_config('albion.defer_all_edge', 'off', true);
         refresh materialized view albion.all_edge;
 
         return (select count(1) from _albion.cell);
@@ -313,23 +404,78 @@ $$
 $$
 ;
 
+-- vertices of a cell, whatever their order
+create or replace function albion.cell_key(a varchar, b varchar, c varchar)
+returns varchar[]
+language sql immutable
+as
+$$
+    select array(select v from unnest(array[a, b, c]) as v order by v)
+$$
+;
+
+-- updates the cells after holes or named section cuts have been added, moved
+-- or removed: the triangulation of the collars only changes around them, cells
+-- of the new triangulation that already exist (same vertices and geometry) keep
+-- their id, and their volumes and groups, the others replace the cells that
+-- are not in the new triangulation and are flagged dirty for all graphs
+--
+-- returns the number of new cells
+create or replace function albion.retriangulate()
+returns integer
+language plpgsql volatile
+as
+$$
+    declare
+        nb_new integer;
+    begin
+        create temporary table new_cell as
+        select albion.cell_key(t.a, t.b, t.c) as key, t.a, t.b, t.c, t.geom
+        from albion.tessellation() as t;
+
+        perform set_config('albion.defer_all_edge', 'on', true);
+
+        delete from _albion.cell as c
+        where not exists (
+            select 1 from new_cell as n
+            where n.key=albion.cell_key(c.a, c.b, c.c) and st_equals(n.geom, c.geom));
+
+        with inserted as (
+            insert into _albion.cell(a, b, c, geom)
+            select n.a, n.b, n.c, n.geom
+            from new_cell as n
+            where not exists (
+                select 1 from _albion.cell as c
+                where albion.cell_key(c.a, c.b, c.c)=n.key and st_equals(n.geom, c.geom))
+            returning id
+        ),
+        dirty as (
+            insert into _albion.dirty_cell(graph_id, cell_id)
+            select g.id, i.id from inserted as i cross join _albion.graph as g
+            returning cell_id
+        )
+        select count(1) into nb_new from inserted;
+
+        drop table new_cell;
+
+        perform set_config('albion.defer_all_edge', 'off', true);
+        refresh materialized view albion.all_edge;
+
+        return nb_new;
+    end;
+$$
+;
+
+-- cosine of the angle between anchor_ (first to last point) and the segment
+-- start_ end_ in the horizontal plane
 create or replace function albion.cos_angle(anchor_ geometry, start_ geometry, end_ geometry)
 returns real
-language plpython3u immutable
+language sql immutable
 as
 $$
-    import numpy
-    from numpy.linalg import norm
-    from shapely import wkb
-    anchor = wkb.loads(bytes.fromhex(anchor_))
-    start = wkb.loads(bytes.fromhex(start_))
-    end = wkb.loads(bytes.fromhex(end_))
-    dir = numpy.array(anchor.coords[-1]) - numpy.array(anchor.coords[0])
-    dir /= norm(dir)
-    seg = numpy.array(end.coords[0]) - numpy.array(start.coords[0])
-    seg /= norm(seg)
-
-    return dir.dot(seg)
+    select (((st_x(st_endpoint(anchor_)) - st_x(st_startpoint(anchor_)))*(st_x(end_) - st_x(start_))
+        + (st_y(st_endpoint(anchor_)) - st_y(st_startpoint(anchor_)))*(st_y(end_) - st_y(start_)))
+        / (st_distance(st_startpoint(anchor_), st_endpoint(anchor_))*st_distance(start_, end_)))::real
 $$
 ;
 
@@ -546,47 +692,38 @@ create trigger group_cell_instead_trig
        for each row execute procedure albion.group_cell_instead_fct()
 ;
 
+-- projection of geom on the vertical plane containing anchor, the projected
+-- point is orig + ((x, y) - orig).dir*dir + z_scale*z*nrml in the map coordinates
+-- with dir the unit vector along anchor and nrml its normal, this is linear in
+-- x, y, z so the whole geometry is transformed by a single st_affine
 create or replace function albion.to_section(geom geometry, anchor geometry, z_scale real)
 returns geometry
-language plpython3u immutable
+language plpgsql immutable
 as
 $$
-    import plpy
-    from shapely.ops import transform
-    from shapely.geometry import LineString
-    from shapely import wkb
-    from shapely import geos
-    import numpy
-    from numpy.linalg import norm
-    geos.WKBWriter.defaults['include_srid'] = True
-
-    if geom is None:
-        return None
-    g = wkb.loads(bytes.fromhex(geom))
-    a = wkb.loads(bytes.fromhex(anchor))
-    orig = numpy.array(a.coords[0])
-    dir_ = numpy.array(a.coords[-1]) - orig
-    dir_ /= norm(dir_)
-    nrml_ = numpy.array([-dir_[1] , dir_[0]])
-
-    if g.type == 'LineString':
-        xyz = numpy.array(g.coords)
-        xyz[:,:2] -= orig
-        xy = xyz[:,:2].dot(dir_).reshape(-1,1)*dir_
-        xy += z_scale*xyz[:,2].reshape(-1,1)*nrml_
-        xy += orig
-        result = LineString(xy)
-    else:
-        def tr(x, y, z=None):
-            z = z or (0,)*len(x)
-            xy = (numpy.array((x,y)).T - orig).dot(dir_).reshape(-1,1)*dir_
-            xy += z_scale*numpy.array(z).reshape(-1,1)*nrml_
-            xy += orig
-            return zip(*((x_, y_) for x_, y_ in xy ))
-
-        result = transform(tr, g)
-    geos.lgeos.GEOSSetSRID(result._geom, geos.lgeos.GEOSGetSRID(g._geom))
-    return result.wkb_hex
+    declare
+        ox double precision;
+        oy double precision;
+        dx double precision;
+        dy double precision;
+        l double precision;
+    begin
+        if geom is null then
+            return null;
+        end if;
+        ox := st_x(st_startpoint(anchor));
+        oy := st_y(st_startpoint(anchor));
+        dx := st_x(st_endpoint(anchor)) - ox;
+        dy := st_y(st_endpoint(anchor)) - oy;
+        l := sqrt(dx*dx + dy*dy);
+        dx := dx/l;
+        dy := dy/l;
+        return st_force2d(st_affine(geom,
+            dx*dx, dx*dy, -z_scale*dy,
+            dx*dy, dy*dy, z_scale*dx,
+            0, 0, 0,
+            ox - dx*dx*ox - dx*dy*oy, oy - dx*dy*ox - dy*dy*oy, 0));
+    end;
 $$
 ;
 
@@ -633,20 +770,177 @@ $$
 $$
 ;
 
-create view albion.hole_section as
-select row_number() over() as id, h.id as hole_id, h.depth_, s.id as section_id,
-    (albion.to_section(h.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as geom
+-- identifies the position of a section, the projections depend on anchor and scale too
+create or replace function albion.section_hash(geom geometry, anchor geometry, scale real)
+returns varchar
+language sql immutable
+as
+$$
+    select md5(st_asewkb(geom)::text || st_asewkb(anchor)::text || scale::text)::varchar
+$$
+;
+
+-- holes whose collar is on a section line, with their rank along the anchor and
+-- their projection, for the current position of each section
+create table albion.section_hole_cache(
+    section_id varchar not null,
+    section_hash varchar not null,
+    hole_id varchar not null,
+    rk integer not null,
+    geom geometry('LINESTRING', $SRID)
+)
+;
+
+create index section_hole_cache_section_idx on albion.section_hole_cache(section_id, section_hash)
+;
+
+create index section_hole_cache_hole_id_idx on albion.section_hole_cache(hole_id)
+;
+
+-- add the rows of the current position of section_id_ (of all sections if null) if they are not cached
+create or replace function albion.section_hole_cache_fill(section_id_ varchar default null)
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        insert into albion.section_hole_cache(section_id, section_hash, hole_id, rk, geom)
+        select s.id, albion.section_hash(s.geom, s.anchor, s.scale), h.id,
+            rank() over(partition by s.id order by st_linelocatepoint(s.anchor, st_startpoint(h.geom))),
+            albion.to_section(h.geom, s.anchor, s.scale)
+        from _albion.section as s
+        join _albion.hole as h on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom)
+        where (section_id_ is null or s.id=section_id_)
+        and not exists (
+            select 1 from albion.section_hole_cache as c
+            where c.section_id=s.id and c.section_hash=albion.section_hash(s.geom, s.anchor, s.scale));
+    end;
+$$
+;
+
+create or replace function albion.section_hole_cache_section_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        if tg_op = 'DELETE' or (tg_op = 'UPDATE' and new.id != old.id) then
+            delete from albion.section_hole_cache where section_id=old.id;
+        elsif tg_op = 'UPDATE' then
+            -- rows of the positions the section has left
+            delete from albion.section_hole_cache
+            where section_id=old.id and section_hash!=albion.section_hash(new.geom, new.anchor, new.scale);
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            perform albion.section_hole_cache_fill(new.id);
+        end if;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists section_hole_cache_section_trig on _albion.section
+;
+
+create trigger section_hole_cache_section_trig
+    after insert or delete or update of id, anchor, geom, scale on _albion.section
+       for each row execute procedure albion.section_hole_cache_section_fct()
+;
+
+-- the sections on which a hole collar is added, removed or moved are refilled,
+-- the ranks of the other holes of these sections change too
+create or replace function albion.section_hole_cache_hole_fct()
+returns trigger
+language plpgsql
+as
+$$
+    declare
+        section_ids varchar[];
+    begin
+        if tg_op = 'TRUNCATE' then
+            delete from albion.section_hole_cache;
+            return null;
+        elsif tg_op = 'INSERT' then
+            select array_agg(distinct s.id) into section_ids
+            from _albion.section as s
+            join new_rows as h on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom);
+        elsif tg_op = 'DELETE' then
+            select array_agg(distinct s.id) into section_ids
+            from _albion.section as s
+            join old_rows as h on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom);
+        else
+            select array_agg(distinct s.id) into section_ids
+            from _albion.section as s
+            join (select id, geom from old_rows union all select id, geom from new_rows) as h
+                on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom);
+        end if;
+        if section_ids is null then
+            return null;
+        end if;
+        delete from albion.section_hole_cache where section_id = any(section_ids);
+        perform albion.section_hole_cache_fill(id) from unnest(section_ids) as id;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists section_hole_cache_hole_insert_trig on _albion.hole
+;
+
+create trigger section_hole_cache_hole_insert_trig
+    after insert on _albion.hole
+       referencing new table as new_rows
+       for each statement execute procedure albion.section_hole_cache_hole_fct()
+;
+
+drop trigger if exists section_hole_cache_hole_update_trig on _albion.hole
+;
+
+create trigger section_hole_cache_hole_update_trig
+    after update on _albion.hole
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.section_hole_cache_hole_fct()
+;
+
+drop trigger if exists section_hole_cache_hole_delete_trig on _albion.hole
+;
+
+create trigger section_hole_cache_hole_delete_trig
+    after delete on _albion.hole
+       referencing old table as old_rows
+       for each statement execute procedure albion.section_hole_cache_hole_fct()
+;
+
+drop trigger if exists section_hole_cache_hole_truncate_trig on _albion.hole
+;
+
+create trigger section_hole_cache_hole_truncate_trig
+    after truncate on _albion.hole
+       for each statement execute procedure albion.section_hole_cache_hole_fct()
+;
+
+select albion.section_hole_cache_fill()
+;
+
+create view albion.current_section_hole as
+select s.id as section_id, s.anchor, s.scale, c.hole_id, c.rk, c.geom
 from _albion.section as s
-join _albion.hole as h on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom)
+join albion.section_hole_cache as c on c.section_id=s.id and c.section_hash=albion.section_hash(s.geom, s.anchor, s.scale)
+;
+
+create view albion.hole_section as
+select row_number() over() as id, h.id as hole_id, h.depth_, sh.section_id,
+    sh.geom::geometry('LINESTRING', $SRID) as geom
+from albion.current_section_hole as sh
+join _albion.hole as h on h.id=sh.hole_id
 ;
 
 
 create view albion.node_section as
-select row_number() over() as id, n.id as node_id, h.id as hole_id, n.from_, n.to_, n.graph_id, s.id as section_id,
-    (albion.to_section(n.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as geom, n.parent
-from _albion.section as s
-join _albion.hole as h on s.geom && h.geom and st_intersects(st_startpoint(h.geom), s.geom)
-join _albion.node as n on n.hole_id = h.id
+select row_number() over() as id, n.id as node_id, sh.hole_id, n.from_, n.to_, n.graph_id, sh.section_id,
+    (albion.to_section(n.geom, sh.anchor, sh.scale))::geometry('LINESTRING', $SRID) as geom, n.parent
+from albion.current_section_hole as sh
+join _albion.node as n on n.hole_id = sh.hole_id
 ;
 
 
@@ -943,24 +1237,14 @@ create trigger edge_instead_trig
 ;
 
 create view albion.edge_section as
-with hole_idx as (
-    select h.id, rank() over(partition by s.id order by st_linelocatepoint(s.anchor, st_startpoint(h.geom))) as rk, s.id as section_id
-    from _albion.section as s
-    join _albion.hole as h on s.geom && h.geom and st_intersects(s.geom, st_startpoint(h.geom))
-)
-select  s.id || ' ' || e.id as id, e.id as edge_id, e.start_, e.end_, e.graph_id, s.id as section_id,
-    (albion.to_section(e.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as geom
+select  cs.section_id || ' ' || e.id as id, e.id as edge_id, e.start_, e.end_, e.graph_id, cs.section_id,
+    (albion.to_section(e.geom, cs.anchor, cs.scale))::geometry('LINESTRING', $SRID) as geom
 from _albion.edge as e
 join _albion.node as ns on ns.id=e.start_
 join _albion.node as ne on ne.id=e.end_
-join _albion.hole as hs on hs.id=ns.hole_id
-join _albion.hole as he on he.id=ne.hole_id
-join hole_idx as cs on cs.id=hs.id
-join hole_idx as ce on ce.id=he.id,
-_albion.section as s
+join albion.current_section_hole as cs on cs.hole_id=ns.hole_id
+join albion.current_section_hole as ce on ce.hole_id=ne.hole_id and ce.section_id=cs.section_id
 where ((cs.rk = ce.rk + 1) or (ce.rk = cs.rk + 1))
-and cs.section_id=s.id
-and ce.section_id=s.id
 ;
 
 alter view albion.edge_section alter column id set default _albion.unique_id();
@@ -1028,27 +1312,42 @@ create trigger edge_section_instead_trig
 ;
 
 create view albion.possible_edge_section as
-select row_number() over() as id, e.start_, e.end_, e.graph_id, s.id as section_id,
-    (albion.to_section(e.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as geom --, e.parent
+select row_number() over() as id, e.start_, e.end_, e.graph_id, hs.section_id,
+    (albion.to_section(e.geom, hs.anchor, hs.scale))::geometry('LINESTRING', $SRID) as geom --, e.parent
 from albion.possible_edge as e
 join _albion.node as ns on ns.id=e.start_
 join _albion.node as ne on ne.id=e.end_
-join _albion.hole as hs on hs.id=ns.hole_id
-join _albion.hole as he on he.id=ne.hole_id
-join _albion.section as s on s.geom && hs.geom and st_intersects(s.geom, st_startpoint(hs.geom)) and
-                             s.geom && he.geom and st_intersects(s.geom, st_startpoint(he.geom))
+join albion.current_section_hole as hs on hs.hole_id=ns.hole_id
+join albion.current_section_hole as he on he.hole_id=ne.hole_id and he.section_id=hs.section_id
 ;
 
+-- plpython receives and returns geometries as hex text, volumes are exchanged
+-- as EWKB (bytea) instead, see albion.dynamic_volume
 create type albion.volume_row as (
-    geom geometry('MULTIPOLYGONZ', $SRID),
-    face1 geometry('MULTIPOLYGONZ', $SRID),
-    face2 geometry('MULTIPOLYGONZ', $SRID),
-    face3 geometry('MULTIPOLYGONZ', $SRID))
+    geom bytea,
+    face1 bytea,
+    face2 bytea,
+    face3 bytea)
+;
+
+-- executes the source of elementary_volume/__init__.py once per session, the
+-- module is kept in GD (shared by plpython functions) for the following calls
+create or replace function albion.load_elementary_volume()
+returns void
+language plpython3u volatile
+as
+$$
+    if 'elementary_volume' not in GD:
+        import types
+        module = types.ModuleType('elementary_volume')
+        exec($INCLUDE_ELEMENTARY_VOLUME, module.__dict__)
+        GD['elementary_volume'] = module
+$$
 ;
 
-create or replace function albion.elementary_volumes(cell_id_ varchar, graph_id_ varchar, geom_ geometry, holes_ varchar[], starts_ varchar[], ends_ varchar[], hole_ids_ varchar[], node_ids_ varchar[], nodes_ geometry[], end_ids_ varchar[], end_geoms_ geometry[], end_holes_ varchar[], end_node_relative_distance real, end_node_relative_thickness real)
+create or replace function albion.elementary_volumes(cell_id_ varchar, graph_id_ varchar, geom_ geometry, holes_ varchar[], starts_ varchar[], ends_ varchar[], hole_ids_ varchar[], node_ids_ varchar[], nodes_ bytea[], end_ids_ varchar[], end_geoms_ bytea[], end_holes_ varchar[], end_node_relative_distance real, end_node_relative_thickness real)
 returns setof albion.volume_row
-language plpython3u immutable
+language plpython3u volatile
 as
 $$
 #open('/tmp/debug_input_%s.txt'%(cell_id_), 'w').write(
@@ -1065,33 +1364,44 @@ $$
 #    ' '.join(end_geoms_)+'\n'+
 #    ' '.join(end_holes_)+'\n'
 #)
-$INCLUDE_ELEMENTARY_VOLUME
-for g, f1, f2, f3 in elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end_ids_, end_geoms_, end_holes_, $SRID, end_node_relative_distance, end_node_relative_thickness):
+if 'elementary_volume' not in GD:
+    plpy.execute("select albion.load_elementary_volume()")
+# build statistics are recorded in _albion.volume_stats when albion.volume_stats is on
+stats = GD['elementary_volume'].BuildStats() \
+    if plpy.execute("select current_setting('albion.volume_stats', true) = 'on' as on")[0]['on'] \
+    else None
+for g, f1, f2, f3 in GD['elementary_volume'].elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end_ids_, end_geoms_, end_holes_, $SRID, end_node_relative_distance, end_node_relative_thickness, stats, True):
     yield g, f1, f2, f3
-$$
-;
-
+if stats is not None:
+    if 'volume_stats_plan' not in GD:
+        GD['volume_stats_plan'] = plpy.prepare("""
+            insert into _albion.volume_stats(graph_id, cell_id, node_count, edge_count, end_node_count,
+                volume_count, open_volume_count, triangle_count,
+                parse_time, face_time, tessellation_time, closing_time, component_time, total_time)
+            values ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
+            on conflict (graph_id, cell_id) do update set
+                (node_count, edge_count, end_node_count, volume_count, open_volume_count, triangle_count,
+                parse_time, face_time, tessellation_time, closing_time, component_time, total_time, created)
+                = (excluded.node_count, excluded.edge_count, excluded.end_node_count, excluded.volume_count,
+                excluded.open_volume_count, excluded.triangle_count, excluded.parse_time, excluded.face_time,
+                excluded.tessellation_time, excluded.closing_time, excluded.component_time, excluded.total_time, now())
+            """, ['varchar', 'varchar'] + ['integer']*6 + ['real']*6)
+    c, t = stats.counts, stats.times
+    plpy.execute(GD['volume_stats_plan'], [graph_id_, cell_id_,
+        c['nodes'], c['edges'], c['end_nodes'], c['volumes'], c['open_volumes'], c['triangles'],
+        t['parse'], t['faces'], t['tessellation'], t['closing'], t['components'], sum(t.values())])
+$$
+;
+
+-- mesh functions are built on the numpy mesh kernel of elementary_volume
 create or replace function albion.volume_of_geom(multipoly geometry)
 returns real
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-    import plpy
-    from numpy import array, average
-
-    m = wkb.loads(bytes.fromhex(multipoly))
-    volume = 0
-    for p in m:
-        r = p.exterior.coords
-        v210 = r[2][0]*r[1][1]*r[0][2];
-        v120 = r[1][0]*r[2][1]*r[0][2];
-        v201 = r[2][0]*r[0][1]*r[1][2];
-        v021 = r[0][0]*r[2][1]*r[1][2];
-        v102 = r[1][0]*r[0][1]*r[2][2];
-        v012 = r[0][0]*r[1][1]*r[2][2];
-        volume += (1./6.)*(-v210 + v120 + v201 - v021 - v102 + v012)
-    return volume
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].volume_of_geom(multipoly)
 $$
 ;
 
@@ -1100,23 +1410,102 @@ returns boolean
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-
-    m = wkb.loads(bytes.fromhex(multipoly))
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].is_closed_volume(multipoly)
+$$
+;
 
-    edges = set()
-    for p in m:
-        for s, e in zip(p.exterior.coords[:-1], p.exterior.coords[1:]):
-            if (e, s) in edges:
-                edges.remove((e, s))
-            else:
-                edges.add((s, e))
-    return len(edges)==0
+-- compact representation of the triangles of a MULTIPOLYGONZ: vertices are
+-- stored once (float64) and triangles as int32 vertex indices, see to_mesh in
+-- elementary_volume/__init__.py for the layout
+create or replace function albion.to_mesh(multipoly geometry)
+returns bytea
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].to_mesh(multipoly)
 $$
 ;
 
-create or replace view albion.volume as
-select id, graph_id, cell_id, triangulation, albion.volume_of_geom(triangulation) as volume--, albion.is_closed_volume(triangulation) as is_closed
+create or replace function albion.mesh_to_geom(mesh bytea)
+returns geometry
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].mesh_to_wkb(mesh)
+$$
+;
+
+-- closedness and volume of a MULTIPOLYGONZ given as EWKB, the triangles are
+-- transferred and parsed once for both
+create or replace function albion.volume_metrics(multipoly bytea, out closed boolean, out volume real)
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].volume_metrics(multipoly)
+$$
+;
+
+-- closedness, volume, number of triangles and bounding box of a packed mesh,
+-- its vertices are already merged
+create or replace function albion.mesh_metrics(mesh bytea, out closed boolean, out volume real, out triangle_count integer, out bbox box3d)
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].mesh_metrics(mesh)
+$$
+;
+
+create or replace function albion.mesh_to_obj(mesh bytea)
+returns varchar
+language plpython3u immutable
+as
+$$
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].mesh_to_obj(mesh)
+$$
+;
+
+create or replace function albion.volume_metrics_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        select m.closed, m.volume, m.triangle_count, m.bbox
+        into new.closed, new.volume, new.triangle_count, new.bbox
+        from albion.mesh_metrics(new.mesh) as m;
+        return new;
+    end;
+$$
+;
+
+drop trigger if exists volume_metrics_trig on _albion.volume
+;
+
+create trigger volume_metrics_trig
+    before insert or update of mesh on _albion.volume
+       for each row execute procedure albion.volume_metrics_fct()
+;
+
+-- volumes computed before metrics were stored
+update _albion.volume set mesh=mesh where closed is null
+;
+
+-- volumes are stored as packed meshes, triangulation is derived from them
+create or replace view albion.volume as
+select id, graph_id, cell_id, albion.mesh_to_geom(mesh)::geometry('MULTIPOLYGONZ', $SRID) as triangulation,
+    volume, closed, triangle_count, bbox, mesh
 from _albion.volume
 ;
 
@@ -1125,23 +1514,9 @@ returns geometry
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-    from shapely.geometry import MultiLineString
-    from shapely import geos
-    geos.WKBWriter.defaults['include_srid'] = True
-
-    m = wkb.loads(bytes.fromhex(multipoly))
-
-    edges = set()
-    for p in m:
-        for s, e in zip(p.exterior.coords[:-1], p.exterior.coords[1:]):
-            if (e, s) in edges:
-                edges.remove((e, s))
-            else:
-                edges.add((s, e))
-    result = MultiLineString(list(edges))
-    geos.lgeos.GEOSSetSRID(result._geom, geos.lgeos.GEOSGetSRID(m._geom))
-    return result
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].mesh_boundarie(multipoly)
 $$
 ;
 
@@ -1151,74 +1526,11 @@ returns geometry
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-    from shapely.geometry import Polygon, MultiPolygon, LineString, MultiLineString
-    from shapely import geos
-    geos.WKBWriter.defaults['include_srid'] = True
-
     if multipoly is None:
         return None
-
-    m = wkb.loads(bytes.fromhex(multipoly))
-
-    node_map = {}
-    triangles = []
-    vtx = []
-    for p in m:
-        t = []
-        for v in p.exterior.coords[:-1]:
-            v = (round(v[0], 6), round(v[1], 6), round(v[2], 6))
-            if v not in node_map:
-                node_map[v] = len(vtx)
-                vtx.append(v)
-            t.append(node_map[v])
-        triangles.append(t)
-
-    exterior = set()
-    for t in triangles:
-        rt = tuple(reversed(t))
-        if rt in exterior:
-            exterior.remove(rt)
-        elif (rt[1:]+rt[:1]) in exterior:
-            exterior.remove(rt[1:]+rt[:1])
-        elif (rt[2:]+rt[:2]) in exterior:
-            exterior.remove(rt[2:]+rt[:2])
-        else:
-            exterior.add(tuple(t))
-
-    result = MultiPolygon([Polygon([vtx[p] for p in t]) for t in exterior])
-
-    ## check for pairs of triangles with centroid less than 1cm appart
-    #suspects = []
-    #r = list(result)
-    #for i, p in enumerate(r):
-    #    for q in r[i+1:]:
-    #        if p.centroid.distance(q.centroid) < .01:
-    #            suspects.append(p)
-    #            suspects.append(q)
-    #rv = plpy.execute("SELECT albion.to_obj('{}'::geometry) as obj".format(MultiPolygon(suspects).wkb_hex))
-    #open("/tmp/unclosed_suspects.obj", 'w').write(rv[0]['obj'])
-
-
-    ## check generated volume is closed
-    #edges = set()
-    #for p in result:
-    #    for s, e in zip(p.exterior.coords[:-1], p.exterior.coords[1:]):
-    #        if (e, s) in edges:
-    #            edges.remove((e, s))
-    #        else:
-    #            edges.add((s, e))
-    #if (len(edges)):
-    #    rv = plpy.execute("SELECT albion.to_obj('{}'::geometry) as obj".format(result.wkb_hex))
-    #    open("/tmp/unclosed_volume.obj", 'w').write(rv[0]['obj'])
-
-    #    rv = plpy.execute("SELECT albion.to_vtk('{}'::geometry) as vtk".format(MultiLineString([LineString(e) for e in edges]).wkt))
-    #    open("/tmp/unclosed_border.vtk", 'w').write(rv[0]['vtk'])
-    #    plpy.error("elementary volume is not closed", edges)
-    #assert(len(edges)==0)
-
-    geos.lgeos.GEOSSetSRID(result._geom, geos.lgeos.GEOSGetSRID(m._geom))
-    return result.wkb_hex
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].volume_union(multipoly)
 $$
 ;
 
@@ -1227,28 +1539,9 @@ returns varchar
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-    if multipoly is None:
-        return ''
-    m = wkb.loads(bytes.fromhex(multipoly))
-    res = ""
-    node_map = {}
-    elem = []
-    n = 0
-    for p in m:
-        elem.append([])
-        for c in p.exterior.coords[:-1]:
-            sc = "%f %f %f" % (tuple(c))
-            if sc not in node_map:
-                res += "v {}\n".format(sc)
-                n += 1
-                node_map[sc] = n
-                elem[-1].append(str(n))
-            else:
-                elem[-1].append(str(node_map[sc]))
-    for e in elem:
-        res += "f {}\n".format(" ".join(e))
-    return res
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].to_obj(multipoly)
 $$
 ;
 
@@ -1257,36 +1550,9 @@ returns varchar
 language plpython3u immutable
 as
 $$
-    from shapely import wkb
-    if multiline is None:
-        return ''
-    m = wkb.loads(bytes.fromhex(multiline))
-    res = "# vtk DataFile Version 4.0\nvtk output\nASCII\nDATASET POLYDATA\n"
-    node_map = {}
-    nodes = ""
-    elem = []
-    n = 0
-    for l in m:
-        elem.append([])
-        for c in l.coords:
-            sc = "%f %f %f" % (tuple(c))
-            if sc not in node_map:
-                nodes += sc+"\n"
-                node_map[sc] = n
-                elem[-1].append(str(n))
-                n += 1
-            else:
-                elem[-1].append(str(node_map[sc]))
-
-    res += "POINTS {} float\n".format(len(node_map))
-    res += nodes
-
-    res += "\n"
-    res += "LINES {} {}\n".format(len(elem), sum([len(e)+1 for e in elem]))
-
-    for e in elem:
-        res += "{} {}\n".format(len(e), " ".join(e))
-    return res
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].to_vtk(multiline)
 $$
 ;
 
@@ -1376,20 +1642,13 @@ join albion.average_normal as nrml on nrml.id = coalesce(n.parent, n.id);
 
 
 create or replace view albion.end_node_section as
-with hole_idx as (
-    select h.id, rank() over(partition by s.id order by st_linelocatepoint(s.anchor, st_startpoint(h.geom))) as rk, h.id as hole_id, s.id as section_id
-    from _albion.section as s
-    join _albion.hole as h on s.geom && h.geom and st_intersects(s.geom, st_startpoint(h.geom))
-)
-select  tn.id||' '||s.id as id, tn.id as end_node_id, n.id as node_id, tn.graph_id, s.id as section_id,
-    (albion.to_section(tn.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as geom,
-    (albion.to_section(n.geom, s.anchor, s.scale))::geometry('LINESTRING', $SRID) as node_geom
+select  tn.id||' '||cn.section_id as id, tn.id as end_node_id, n.id as node_id, tn.graph_id, cn.section_id,
+    (albion.to_section(tn.geom, cn.anchor, cn.scale))::geometry('LINESTRING', $SRID) as geom,
+    (albion.to_section(n.geom, cn.anchor, cn.scale))::geometry('LINESTRING', $SRID) as node_geom
 from _albion.end_node as tn
 join _albion.node as n on n.id=tn.node_id
-join _albion.hole as h on h.id=n.hole_id
-join _albion.section as s on true
-join hole_idx as cn on (cn.id=h.id and cn.section_id=s.id)
-join hole_idx as cc on (cc.id=tn.hole_id and cc.section_id=s.id)
+join albion.current_section_hole as cn on cn.hole_id=n.hole_id
+join albion.current_section_hole as cc on cc.hole_id=tn.hole_id and cc.section_id=cn.section_id
 where cn.rk=cc.rk+1 or cc.rk=cn.rk+1
 ;
 
@@ -1481,46 +1740,528 @@ where not st_isempty(geom)
 
 
 
-create or replace view albion.dynamic_volume as
-with res as (
+-- hash of the source of the volume builder, part of the key of cached volumes
+create or replace function albion.elementary_volume_hash()
+returns varchar
+language plpython3u immutable
+as
+$$
+    import hashlib
+    return hashlib.md5($INCLUDE_ELEMENTARY_VOLUME.encode()).hexdigest()
+$$
+;
+
+-- arguments of albion.elementary_volumes for each cell and graph, also used to
+-- dump the inputs of the volume builder (see elementary_volume/benchmark.py)
+--
+-- input_hash, the key of the volumes of the cell in _albion.volume_cache, does
+-- not depend on node ids (unique across graphs) so that cells of different
+-- graphs with the same nodes share their volumes: nodes are keyed by hole and
+-- geometry, edges and end nodes refer to the position of their nodes in that
+-- order
+--
+-- nodes, edges and end nodes of the cell are read from the per hole tables
+-- _albion.hole_node, hole_pair_edge and hole_pair_end_node (a few index lookups
+-- per cell instead of joins on _albion.node)
+create or replace view albion.elementary_volume_input as
+select cell_id, graph_id, starts, ends, hole_ids, node_ids, node_geoms, node_wkbs, end_ids, end_geoms, end_wkbs, geom, holes, end_holes,
+    end_node_relative_distance, end_node_relative_thickness,
+    md5(albion.elementary_volume_hash() || row(holes, end_node_relative_distance, end_node_relative_thickness)::text
+        || ';' || node_key
+        || ';' || coalesce((
+            select string_agg(ns.pos||' '||ne.pos, ',' order by ns.pos, ne.pos)
+            from unnest(starts, ends) as e(start_, end_)
+            join unnest(node_key_ids) with ordinality as ns(id, pos) on ns.id=e.start_
+            join unnest(node_key_ids) with ordinality as ne(id, pos) on ne.id=e.end_), '')
+        || ';' || coalesce((
+            select string_agg(n.pos||' '||t.hole_id||' '||encode(t.wkb, 'hex'), ',' order by n.pos, t.hole_id, t.wkb)
+            from unnest(end_ids, end_holes, end_wkbs) as t(node_id, hole_id, wkb)
+            join unnest(node_key_ids) with ordinality as n(id, pos) on n.id=t.node_id), ''))::varchar as input_hash
+from (
 select
-c.id as cell_id, g.id as graph_id, ed.starts, ed.ends, nd.hole_ids as hole_ids, nd.ids as node_ids, nd.geoms as node_geoms, en.ids as end_ids, en.geoms as end_geoms, c.geom, ARRAY[ha.id, hb.id, hc.id] as holes, en.end_holes
+c.id as cell_id, g.id as graph_id, ed.starts, ed.ends, nd.hole_ids as hole_ids, nd.ids as node_ids, nd.geoms as node_geoms, nd.wkbs as node_wkbs, en.ids as end_ids, en.geoms as end_geoms, en.wkbs as end_wkbs, c.geom, ARRAY[c.a, c.b, c.c] as holes, en.end_holes,
+m.end_node_relative_distance, m.end_node_relative_thickness, nk.ids as node_key_ids, nk.key as node_key
 from  _albion.graph as g
+join _albion.metadata as m on true
 join _albion.cell as c on true
-join _albion.hole as ha on ha.id = c.a
-join _albion.hole as hb on hb.id = c.b
-join _albion.hole as hc on hc.id = c.c
 join lateral (
-    select coalesce(array_agg(n.id), '{}'::varchar[]) as ids, coalesce(array_agg(n.hole_id), '{}'::varchar[]) as hole_ids, coalesce(array_agg(n.geom), '{}'::geometry[]) as geoms
-    from _albion.node as n
-    where n.hole_id in (ha.id, hb.id, hc.id)
-    and n.graph_id=g.id
+    select coalesce(array_agg(t.id order by t.id), '{}'::varchar[]) as ids, coalesce(array_agg(h.hole_id order by t.id), '{}'::varchar[]) as hole_ids, coalesce(array_agg(t.geom order by t.id), '{}'::geometry[]) as geoms, coalesce(array_agg(st_asewkb(t.geom) order by t.id), '{}'::bytea[]) as wkbs
+    from _albion.hole_node as h
+    cross join unnest(h.ids, h.geoms) as t(id, geom)
+    where h.hole_id in (c.a, c.b, c.c)
+    and h.graph_id=g.id
 ) as nd on true
 join lateral (
-    select coalesce(array_agg(e.start_), '{}'::varchar[]) as starts, coalesce(array_agg(e.end_), '{}'::varchar[]) as ends
-    from _albion.edge as e
-    join _albion.node as ns on ns.id=e.start_
-    join _albion.node as ne on ne.id=e.end_
-    where ne.hole_id in (ha.id, hb.id, hc.id) and ns.hole_id in (ha.id, hb.id, hc.id)
-    and e.graph_id=g.id
+    select coalesce(array_agg(t.start_ order by t.id), '{}'::varchar[]) as starts, coalesce(array_agg(t.end_ order by t.id), '{}'::varchar[]) as ends
+    from _albion.hole_pair_edge as h
+    cross join unnest(h.ids, h.starts, h.ends) as t(id, start_, end_)
+    where h.hole_a in (c.a, c.b, c.c) and h.hole_b in (c.a, c.b, c.c)
+    and h.graph_id=g.id
 ) as ed on true
 join lateral (
-    select coalesce(array_agg(en.node_id), '{}'::varchar[]) as ids, coalesce(array_agg(en.geom), '{}'::geometry[]) as geoms, coalesce(array_agg(en.hole_id), '{}'::varchar[]) as end_holes
-    from _albion.end_node as en
-    join _albion.node as n on n.id=en.node_id
-    where en.hole_id in (c.a, c.b, c.c)
-    and n.hole_id in (ha.id, hb.id, hc.id)
-    and en.graph_id=g.id
+    select coalesce(array_agg(t.node_id order by t.id), '{}'::varchar[]) as ids, coalesce(array_agg(t.geom order by t.id), '{}'::geometry[]) as geoms, coalesce(array_agg(st_asewkb(t.geom) order by t.id), '{}'::bytea[]) as wkbs, coalesce(array_agg(h.hole_id order by t.id), '{}'::varchar[]) as end_holes
+    from _albion.hole_pair_end_node as h
+    cross join unnest(h.ids, h.node_ids, h.geoms) as t(id, node_id, geom)
+    where h.hole_id in (c.a, c.b, c.c)
+    and h.node_hole_id in (c.a, c.b, c.c)
+    and h.graph_id=g.id
 ) as en on true
-)
+join lateral (
+    select coalesce(array_agg(t.id order by t.hole_id, t.wkb, t.id), '{}'::varchar[]) as ids, coalesce(string_agg(t.hole_id||' '||encode(t.wkb, 'hex'), ',' order by t.hole_id, t.wkb, t.id), '') as key
+    from unnest(nd.ids, nd.hole_ids, nd.wkbs) as t(id, hole_id, wkb)
+) as nk on true
+) as t
+;
+
+-- res is a subquery rather than a CTE so that filters on cell_id and graph_id
+-- are pushed down (volumes can be computed by batch of cells)
+create or replace view albion.dynamic_volume as
 select cell_id, graph_id,
-    t.geom::geometry('MULTIPOLYGONZ', $SRID),
-    t.face1::geometry('MULTIPOLYGONZ', $SRID),
-    t.face2::geometry('MULTIPOLYGONZ', $SRID),
-    t.face3::geometry('MULTIPOLYGONZ', $SRID),
+    st_geomfromewkb(t.geom)::geometry('MULTIPOLYGONZ', $SRID) as geom,
+    st_geomfromewkb(t.face1)::geometry('MULTIPOLYGONZ', $SRID) as face1,
+    st_geomfromewkb(t.face2)::geometry('MULTIPOLYGONZ', $SRID) as face2,
+    st_geomfromewkb(t.face3)::geometry('MULTIPOLYGONZ', $SRID) as face3,
     starts, ends, holes, hole_ids, node_ids, end_ids, end_geoms
-from res, albion.metadata m
-join  lateral albion.elementary_volumes(cell_id, graph_id, st_force3d(geom), holes, starts, ends, hole_ids, node_ids, node_geoms, end_ids, end_geoms, end_holes, m.end_node_relative_distance, m.end_node_relative_thickness) as t on true
+from albion.elementary_volume_input as res
+join  lateral albion.elementary_volumes(cell_id, graph_id, st_force3d(geom), holes, starts, ends, hole_ids, node_ids, node_wkbs, end_ids, end_wkbs, end_holes, res.end_node_relative_distance, res.end_node_relative_thickness) as t on true
+;
+
+-- cached volumes are evicted when no cell of a graph has their inputs anymore,
+-- only the hashes of the changed rows are checked: deletes by cascade from
+-- _albion.cell fire this trigger once per deleted cell
+create or replace function albion.volume_cache_evict_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        delete from _albion.volume_cache as c
+        using (select distinct input_hash from old_rows) as o
+        where c.input_hash=o.input_hash
+        and not exists (select 1 from _albion.volume_cache_use as u where u.input_hash=c.input_hash);
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists volume_cache_evict_trig on _albion.volume_cache_use
+;
+
+drop trigger if exists volume_cache_evict_delete_trig on _albion.volume_cache_use
+;
+
+create trigger volume_cache_evict_delete_trig
+    after delete on _albion.volume_cache_use
+       referencing old table as old_rows
+       for each statement execute procedure albion.volume_cache_evict_fct()
+;
+
+drop trigger if exists volume_cache_evict_update_trig on _albion.volume_cache_use
+;
+
+create trigger volume_cache_evict_update_trig
+    after update on _albion.volume_cache_use
+       referencing old table as old_rows
+       for each statement execute procedure albion.volume_cache_evict_fct()
+;
+
+-- cells of graph_id_ that have hole_id_ (and other_hole_id_ if not null) as vertex
+-- are flagged for volume update
+create or replace function albion.mark_dirty_cells(graph_id_ varchar, hole_id_ varchar, other_hole_id_ varchar default null)
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        insert into _albion.dirty_cell(graph_id, cell_id)
+        select g.id, c.id
+        from _albion.graph as g, _albion.cell as c
+        where g.id=graph_id_
+        and hole_id_ in (c.a, c.b, c.c)
+        and coalesce(other_hole_id_, hole_id_) in (c.a, c.b, c.c)
+        on conflict do nothing;
+    end;
+$$
+;
+
+create or replace function albion.node_dirty_cell_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            perform albion.mark_dirty_cells(old.graph_id, old.hole_id);
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            perform albion.mark_dirty_cells(new.graph_id, new.hole_id);
+        end if;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists node_dirty_cell_trig on _albion.node
+;
+
+create trigger node_dirty_cell_trig
+    after insert or update or delete on _albion.node
+       for each row execute procedure albion.node_dirty_cell_fct()
+;
+
+create or replace function albion.edge_dirty_cell_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            perform albion.mark_dirty_cells(old.graph_id,
+                (select hole_id from _albion.node where id=old.start_),
+                (select hole_id from _albion.node where id=old.end_));
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            perform albion.mark_dirty_cells(new.graph_id,
+                (select hole_id from _albion.node where id=new.start_),
+                (select hole_id from _albion.node where id=new.end_));
+        end if;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists edge_dirty_cell_trig on _albion.edge
+;
+
+create trigger edge_dirty_cell_trig
+    after insert or update or delete on _albion.edge
+       for each row execute procedure albion.edge_dirty_cell_fct()
+;
+
+create or replace function albion.end_node_dirty_cell_fct()
+returns trigger
+language plpgsql
+as
+$$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            perform albion.mark_dirty_cells(old.graph_id, old.hole_id,
+                (select hole_id from _albion.node where id=old.node_id));
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            perform albion.mark_dirty_cells(new.graph_id, new.hole_id,
+                (select hole_id from _albion.node where id=new.node_id));
+        end if;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists end_node_dirty_cell_trig on _albion.end_node
+;
+
+create trigger end_node_dirty_cell_trig
+    after insert or update or delete on _albion.end_node
+       for each row execute procedure albion.end_node_dirty_cell_fct()
+;
+
+-- groups of _albion.hole_node, hole_pair_edge and hole_pair_end_node given by
+-- arrays of keys are recomputed, a null last key stands for every group with
+-- the other keys
+create or replace function albion.hole_node_refresh(graph_ids_ varchar[], hole_ids_ varchar[])
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        delete from _albion.hole_node as h
+        using unnest(graph_ids_, hole_ids_) as k(graph_id, hole_id)
+        where h.graph_id=k.graph_id and h.hole_id=k.hole_id;
+
+        insert into _albion.hole_node(graph_id, hole_id, ids, geoms)
+        select n.graph_id, n.hole_id, array_agg(n.id order by n.id), array_agg(n.geom order by n.id)
+        from (select distinct graph_id, hole_id from unnest(graph_ids_, hole_ids_) as k(graph_id, hole_id)) as k
+        join _albion.node as n on n.graph_id=k.graph_id and n.hole_id=k.hole_id
+        group by n.graph_id, n.hole_id;
+    end;
+$$
+;
+
+-- edges are read from the nodes of the requested holes (through the start_ and
+-- end_ indexes of _albion.edge) rather than from the whole graph, a key with a
+-- null hole_b keeps every edge found from its hole, other keys the edges of
+-- their pair
+create or replace function albion.hole_pair_edge_refresh(graph_ids_ varchar[], hole_as_ varchar[], hole_bs_ varchar[])
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        delete from _albion.hole_pair_edge as h
+        using unnest(graph_ids_, hole_as_, hole_bs_) as k(graph_id, hole_a, hole_b)
+        where h.graph_id=k.graph_id and h.hole_a=k.hole_a and h.hole_b=k.hole_b;
+
+        delete from _albion.hole_pair_edge as h
+        using unnest(graph_ids_, hole_as_, hole_bs_) as k(graph_id, hole_a, hole_b)
+        where k.hole_b is null and h.graph_id=k.graph_id and h.hole_a=k.hole_a;
+
+        delete from _albion.hole_pair_edge as h
+        using unnest(graph_ids_, hole_as_, hole_bs_) as k(graph_id, hole_a, hole_b)
+        where k.hole_b is null and h.graph_id=k.graph_id and h.hole_b=k.hole_a;
+
+        insert into _albion.hole_pair_edge(graph_id, hole_a, hole_b, ids, starts, ends)
+        select e.graph_id, e.hole_a, e.hole_b, array_agg(e.id order by e.id), array_agg(e.start_ order by e.id), array_agg(e.end_ order by e.id)
+        from (
+            select distinct e.id, e.graph_id, e.start_, e.end_, e.hole_a, e.hole_b
+            from (select distinct * from unnest(graph_ids_, hole_as_, hole_bs_) as k(graph_id, hole_a, hole_b)) as k
+            join _albion.node as n on n.hole_id=k.hole_a and n.graph_id=k.graph_id
+            join lateral (
+                select e.id, e.graph_id, e.start_, e.end_,
+                    least(ns.hole_id, ne.hole_id) as hole_a, greatest(ns.hole_id, ne.hole_id) as hole_b
+                from (
+                    select id, graph_id, start_, end_ from _albion.edge where start_=n.id
+                    union all
+                    select id, graph_id, start_, end_ from _albion.edge where end_=n.id
+                ) as e
+                join _albion.node as ns on ns.id=e.start_
+                join _albion.node as ne on ne.id=e.end_
+                where ns.hole_id is not null and ne.hole_id is not null
+            ) as e on true
+            where k.hole_b is null
+            or e.hole_a=k.hole_a and e.hole_b=k.hole_b
+        ) as e
+        group by e.graph_id, e.hole_a, e.hole_b;
+    end;
+$$
+;
+
+create or replace function albion.hole_pair_end_node_refresh(graph_ids_ varchar[], node_hole_ids_ varchar[], hole_ids_ varchar[])
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        delete from _albion.hole_pair_end_node as h
+        using unnest(graph_ids_, node_hole_ids_, hole_ids_) as k(graph_id, node_hole_id, hole_id)
+        where h.graph_id=k.graph_id and h.node_hole_id=k.node_hole_id and coalesce(k.hole_id, h.hole_id)=h.hole_id;
+
+        insert into _albion.hole_pair_end_node(graph_id, node_hole_id, hole_id, ids, node_ids, geoms)
+        select en.graph_id, n.hole_id, en.hole_id, array_agg(en.id order by en.id), array_agg(en.node_id order by en.id), array_agg(en.geom order by en.id)
+        from (select distinct * from unnest(graph_ids_, node_hole_ids_, hole_ids_) as k(graph_id, node_hole_id, hole_id)) as k
+        join _albion.node as n on n.graph_id=k.graph_id and n.hole_id=k.node_hole_id
+        join _albion.end_node as en on en.node_id=n.id and en.graph_id=k.graph_id and coalesce(k.hole_id, en.hole_id)=en.hole_id
+        group by en.graph_id, n.hole_id, en.hole_id;
+    end;
+$$
+;
+
+-- recompute every group
+create or replace function albion.hole_adjacency_rebuild()
+returns void
+language plpgsql volatile
+as
+$$
+    begin
+        delete from _albion.hole_node;
+        delete from _albion.hole_pair_edge;
+        delete from _albion.hole_pair_end_node;
+        perform albion.hole_node_refresh(array_agg(graph_id), array_agg(hole_id))
+        from (select distinct graph_id, hole_id from _albion.node) as t;
+        perform albion.hole_pair_edge_refresh(array_agg(graph_id), array_agg(hole_id), array_agg(null::varchar))
+        from (select distinct graph_id, hole_id from _albion.node) as t;
+        perform albion.hole_pair_end_node_refresh(array_agg(graph_id), array_agg(hole_id), array_agg(null::varchar))
+        from (select distinct graph_id, hole_id from _albion.node) as t;
+    end;
+$$
+;
+
+-- transition tables are only available to triggers of a single event, the
+-- same function is used by the insert, update and delete triggers of a table
+create or replace function albion.hole_adjacency_node_fct()
+returns trigger
+language plpgsql
+as
+$$
+    declare
+        graph_ids varchar[];
+        hole_ids varchar[];
+    begin
+        if tg_op = 'INSERT' then
+            select array_agg(graph_id), array_agg(hole_id) into graph_ids, hole_ids
+            from (select distinct graph_id, hole_id from new_rows) as t;
+        elsif tg_op = 'DELETE' then
+            select array_agg(graph_id), array_agg(hole_id) into graph_ids, hole_ids
+            from (select distinct graph_id, hole_id from old_rows) as t;
+        else
+            select array_agg(graph_id), array_agg(hole_id) into graph_ids, hole_ids
+            from (select graph_id, hole_id from old_rows union select graph_id, hole_id from new_rows) as t;
+        end if;
+        if graph_ids is null then
+            return null;
+        end if;
+        perform albion.hole_node_refresh(graph_ids, hole_ids);
+        if tg_op != 'INSERT' then
+            -- edges and end nodes of deleted nodes are deleted (by cascade) before
+            -- this trigger, they are not found anymore, groups of their holes are recomputed
+            perform albion.hole_pair_edge_refresh(graph_ids, hole_ids, array_fill(null::varchar, array[cardinality(graph_ids)]));
+            perform albion.hole_pair_end_node_refresh(graph_ids, hole_ids, array_fill(null::varchar, array[cardinality(graph_ids)]));
+        end if;
+        return null;
+    end;
+$$
+;
+
+create or replace function albion.hole_adjacency_edge_fct()
+returns trigger
+language plpgsql
+as
+$$
+    declare
+        graph_ids varchar[];
+        hole_as varchar[];
+        hole_bs varchar[];
+    begin
+        if tg_op = 'INSERT' then
+            select array_agg(graph_id), array_agg(hole_a), array_agg(hole_b) into graph_ids, hole_as, hole_bs
+            from (select distinct e.graph_id, least(ns.hole_id, ne.hole_id) as hole_a, greatest(ns.hole_id, ne.hole_id) as hole_b
+                from new_rows as e
+                join _albion.node as ns on ns.id=e.start_
+                join _albion.node as ne on ne.id=e.end_) as t;
+        elsif tg_op = 'DELETE' then
+            select array_agg(graph_id), array_agg(hole_a), array_agg(hole_b) into graph_ids, hole_as, hole_bs
+            from (select distinct e.graph_id, least(ns.hole_id, ne.hole_id) as hole_a, greatest(ns.hole_id, ne.hole_id) as hole_b
+                from old_rows as e
+                join _albion.node as ns on ns.id=e.start_
+                join _albion.node as ne on ne.id=e.end_) as t;
+        else
+            select array_agg(graph_id), array_agg(hole_a), array_agg(hole_b) into graph_ids, hole_as, hole_bs
+            from (select e.graph_id, least(ns.hole_id, ne.hole_id) as hole_a, greatest(ns.hole_id, ne.hole_id) as hole_b
+                from (select graph_id, start_, end_ from old_rows union select graph_id, start_, end_ from new_rows) as e
+                join _albion.node as ns on ns.id=e.start_
+                join _albion.node as ne on ne.id=e.end_) as t;
+        end if;
+        if graph_ids is not null then
+            perform albion.hole_pair_edge_refresh(graph_ids, hole_as, hole_bs);
+        end if;
+        return null;
+    end;
+$$
+;
+
+create or replace function albion.hole_adjacency_end_node_fct()
+returns trigger
+language plpgsql
+as
+$$
+    declare
+        graph_ids varchar[];
+        node_hole_ids varchar[];
+        hole_ids varchar[];
+    begin
+        if tg_op = 'INSERT' then
+            select array_agg(graph_id), array_agg(node_hole_id), array_agg(hole_id) into graph_ids, node_hole_ids, hole_ids
+            from (select distinct e.graph_id, n.hole_id as node_hole_id, e.hole_id
+                from new_rows as e join _albion.node as n on n.id=e.node_id) as t;
+        elsif tg_op = 'DELETE' then
+            select array_agg(graph_id), array_agg(node_hole_id), array_agg(hole_id) into graph_ids, node_hole_ids, hole_ids
+            from (select distinct e.graph_id, n.hole_id as node_hole_id, e.hole_id
+                from old_rows as e join _albion.node as n on n.id=e.node_id) as t;
+        else
+            select array_agg(graph_id), array_agg(node_hole_id), array_agg(hole_id) into graph_ids, node_hole_ids, hole_ids
+            from (select e.graph_id, n.hole_id as node_hole_id, e.hole_id
+                from (select graph_id, node_id, hole_id from old_rows union select graph_id, node_id, hole_id from new_rows) as e
+                join _albion.node as n on n.id=e.node_id) as t;
+        end if;
+        if graph_ids is not null then
+            perform albion.hole_pair_end_node_refresh(graph_ids, node_hole_ids, hole_ids);
+        end if;
+        return null;
+    end;
+$$
+;
+
+drop trigger if exists hole_adjacency_node_insert_trig on _albion.node
+;
+
+create trigger hole_adjacency_node_insert_trig
+    after insert on _albion.node
+       referencing new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_node_fct()
+;
+
+drop trigger if exists hole_adjacency_node_update_trig on _albion.node
+;
+
+create trigger hole_adjacency_node_update_trig
+    after update on _albion.node
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_node_fct()
+;
+
+drop trigger if exists hole_adjacency_node_delete_trig on _albion.node
+;
+
+create trigger hole_adjacency_node_delete_trig
+    after delete on _albion.node
+       referencing old table as old_rows
+       for each statement execute procedure albion.hole_adjacency_node_fct()
+;
+
+drop trigger if exists hole_adjacency_edge_insert_trig on _albion.edge
+;
+
+create trigger hole_adjacency_edge_insert_trig
+    after insert on _albion.edge
+       referencing new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_edge_fct()
+;
+
+drop trigger if exists hole_adjacency_edge_update_trig on _albion.edge
+;
+
+create trigger hole_adjacency_edge_update_trig
+    after update on _albion.edge
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_edge_fct()
+;
+
+drop trigger if exists hole_adjacency_edge_delete_trig on _albion.edge
+;
+
+create trigger hole_adjacency_edge_delete_trig
+    after delete on _albion.edge
+       referencing old table as old_rows
+       for each statement execute procedure albion.hole_adjacency_edge_fct()
+;
+
+drop trigger if exists hole_adjacency_end_node_insert_trig on _albion.end_node
+;
+
+create trigger hole_adjacency_end_node_insert_trig
+    after insert on _albion.end_node
+       referencing new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_end_node_fct()
+;
+
+drop trigger if exists hole_adjacency_end_node_update_trig on _albion.end_node
+;
+
+create trigger hole_adjacency_end_node_update_trig
+    after update on _albion.end_node
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.hole_adjacency_end_node_fct()
+;
+
+drop trigger if exists hole_adjacency_end_node_delete_trig on _albion.end_node
+;
+
+create trigger hole_adjacency_end_node_delete_trig
+    after delete on _albion.end_node
+       referencing old table as old_rows
+       for each statement execute procedure albion.hole_adjacency_end_node_fct()
+;
+
+select albion.hole_adjacency_rebuild()
 ;
 
 
@@ -1571,23 +2312,9 @@ returns geometry
 language plpython3u immutable
 as
 $$
-    from shapely import geos
-    from shapely.geometry import MultiPolygon, Polygon
-    from shapely import wkb
-    import numpy
-    import plpy
-    geos.WKBWriter.defaults['include_srid'] = True
-    t1 = wkb.loads(bytes.fromhex(t1_))
-    t2 = wkb.loads(bytes.fromhex(t2_))
-
-    t1s = set((tuple(t.exterior.coords[0:3]) for t in t1))
-    t2s = set((tuple(reversed(t.exterior.coords[0:3])) for t in t2))
-
-    result = MultiPolygon([ Polygon(t) for t in t1s.intersection(t2s)])
-    if not len(result):
-        return None
-    geos.lgeos.GEOSSetSRID(result._geom, geos.lgeos.GEOSGetSRID(t1._geom))
-    return result.wkb_hex
+    if 'elementary_volume' not in GD:
+        plpy.execute("select albion.load_elementary_volume()")
+    return GD['elementary_volume'].triangle_intersection(t1_, t2_)
 $$
 ;
 
@@ -1646,15 +2373,10 @@ join lateral (select array_agg(x order by x) as n from (values (a), (b), (c)) as
 ;
 
 create view albion.section_edge as
-with hole_idx as (
-    select s.id as section_id, h.id as hole_id
-    from _albion.section as s
-    join _albion.hole as h on s.geom && h.geom and st_intersects(s.geom, st_startpoint(h.geom))
-)
 select e.start_, e.end_, hs.section_id
 from albion.all_edge as e
-join hole_idx as hs on hs.hole_id = e.start_
-join hole_idx as he on he.hole_id = e.end_ and he.section_id = hs.section_id
+join albion.current_section_hole as hs on hs.hole_id = e.start_
+join albion.current_section_hole as he on he.hole_id = e.end_ and he.section_id = hs.section_id
 ;
 
 create or replace view albion.volume_section as
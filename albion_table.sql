@@ -35,15 +35,19 @@ create trigger ${NAME}_instead_trig
        for each row execute procedure albion.${NAME}_instead_fct()
 ;
 
-create materialized view albion.${NAME}_section_geom_cache as
-select s.id as section_id, h.id as hole_id, t.id as ${NAME}_id,
-    (albion.to_section(
-            st_makeline(st_3dlineinterpolatepoint(h.geom, least(t.from_/h.depth_, 1)), 
-                        st_3dlineinterpolatepoint(h.geom, least(t.to_/h.depth_, 1)))
-                , s.anchor, s.scale)) as geom,
-        st_startpoint(h.geom) as collar
-from _albion.section as s, _albion.${NAME} as t
-join _albion.hole as h on h.id=t.hole_id
+-- projected intervals of the holes whose collar is on the section line, for
+-- the current position (see albion.section_hash) of each section
+create table albion.${NAME}_section_geom_cache(
+    section_id varchar not null,
+    section_hash varchar not null,
+    hole_id varchar not null,
+    ${NAME}_id varchar not null,
+    geom geometry('LINESTRING', ${SRID}),
+    collar geometry('POINTZ', ${SRID})
+)
+;
+
+create index ${NAME}_section_geom_cache_section_idx on albion.${NAME}_section_geom_cache(section_id, section_hash)
 ;
 
 create index ${NAME}_section_geom_cache_${NAME}_id_idx on albion.${NAME}_section_geom_cache(${NAME}_id)
@@ -52,11 +56,211 @@ create index ${NAME}_section_geom_cache_${NAME}_id_idx on albion.${NAME}_section
 create index ${NAME}_section_geom_cache_colar_idx on albion.${NAME}_section_geom_cache using gist(collar)
 ;
 
+-- add the rows of the current position of section_id_ if they are not cached,
+-- recompute the rows of the current position of all sections if null
+create or replace function albion.${NAME}_section_geom_cache_refresh(section_id_ varchar default null)
+returns void
+language plpgsql volatile
+as
+$$$$
+    begin
+        if section_id_ is null then
+            delete from albion.${NAME}_section_geom_cache;
+        end if;
+
+        insert into albion.${NAME}_section_geom_cache(section_id, section_hash, hole_id, ${NAME}_id, geom, collar)
+        select s.id, albion.section_hash(s.geom, s.anchor, s.scale), h.id, t.id,
+            albion.to_section(
+                st_makeline(st_3dlineinterpolatepoint(h.geom, least(t.from_/h.depth_, 1)),
+                            st_3dlineinterpolatepoint(h.geom, least(t.to_/h.depth_, 1)))
+                    , s.anchor, s.scale),
+            st_startpoint(h.geom)
+        from _albion.section as s
+        join _albion.hole as h on st_intersects(s.geom, h.geom) and st_intersects(s.geom, st_startpoint(h.geom))
+        join _albion.${NAME} as t on t.hole_id=h.id
+        where (section_id_ is null or s.id=section_id_)
+        and not exists (
+            select 1 from albion.${NAME}_section_geom_cache as c
+            where c.section_id=s.id and c.section_hash=albion.section_hash(s.geom, s.anchor, s.scale));
+    end;
+$$$$
+;
+
+create or replace function albion.${NAME}_section_geom_cache_fct()
+returns trigger
+language plpgsql
+as
+$$$$
+    begin
+        if tg_op = 'DELETE' or (tg_op = 'UPDATE' and new.id != old.id) then
+            delete from albion.${NAME}_section_geom_cache where section_id=old.id;
+        elsif tg_op = 'UPDATE' then
+            -- rows of the positions the section has left
+            delete from albion.${NAME}_section_geom_cache
+            where section_id=old.id and section_hash!=albion.section_hash(new.geom, new.anchor, new.scale);
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            perform albion.${NAME}_section_geom_cache_refresh(new.id);
+        end if;
+        return null;
+    end;
+$$$$
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_trig on _albion.section
+;
+
+create trigger ${NAME}_section_geom_cache_trig
+    after insert or delete or update of id, anchor, geom, scale on _albion.section
+       for each row execute procedure albion.${NAME}_section_geom_cache_fct()
+;
+
+-- recompute the rows of the holes hole_ids_ and of the intervals ${NAME}_ids_
+-- (either may be null) at the current position of every section
+create or replace function albion.${NAME}_section_geom_cache_update(hole_ids_ varchar[], ${NAME}_ids_ varchar[])
+returns void
+language plpgsql volatile
+as
+$$$$
+    begin
+        delete from albion.${NAME}_section_geom_cache
+        where hole_id = any(hole_ids_) or ${NAME}_id = any(${NAME}_ids_);
+
+        insert into albion.${NAME}_section_geom_cache(section_id, section_hash, hole_id, ${NAME}_id, geom, collar)
+        select s.id, albion.section_hash(s.geom, s.anchor, s.scale), h.id, t.id,
+            albion.to_section(
+                st_makeline(st_3dlineinterpolatepoint(h.geom, least(t.from_/h.depth_, 1)),
+                            st_3dlineinterpolatepoint(h.geom, least(t.to_/h.depth_, 1)))
+                    , s.anchor, s.scale),
+            st_startpoint(h.geom)
+        from _albion.section as s
+        join _albion.hole as h on st_intersects(s.geom, h.geom) and st_intersects(s.geom, st_startpoint(h.geom))
+        join _albion.${NAME} as t on t.hole_id=h.id
+        where h.id = any(hole_ids_) or t.id = any(${NAME}_ids_);
+    end;
+$$$$
+;
+
+create or replace function albion.${NAME}_section_geom_cache_${NAME}_fct()
+returns trigger
+language plpgsql
+as
+$$$$
+    declare
+        ids varchar[];
+    begin
+        if tg_op = 'TRUNCATE' then
+            delete from albion.${NAME}_section_geom_cache;
+            return null;
+        elsif tg_op = 'INSERT' then
+            select array_agg(id) into ids from new_rows;
+        elsif tg_op = 'DELETE' then
+            select array_agg(id) into ids from old_rows;
+        else
+            select array_agg(id) into ids from (select id from old_rows union select id from new_rows) as t;
+        end if;
+        if ids is not null then
+            perform albion.${NAME}_section_geom_cache_update(null, ids);
+        end if;
+        return null;
+    end;
+$$$$
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_${NAME}_insert_trig on _albion.${NAME}
+;
+
+create trigger ${NAME}_section_geom_cache_${NAME}_insert_trig
+    after insert on _albion.${NAME}
+       referencing new table as new_rows
+       for each statement execute procedure albion.${NAME}_section_geom_cache_${NAME}_fct()
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_${NAME}_update_trig on _albion.${NAME}
+;
+
+create trigger ${NAME}_section_geom_cache_${NAME}_update_trig
+    after update on _albion.${NAME}
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.${NAME}_section_geom_cache_${NAME}_fct()
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_${NAME}_delete_trig on _albion.${NAME}
+;
+
+create trigger ${NAME}_section_geom_cache_${NAME}_delete_trig
+    after delete on _albion.${NAME}
+       referencing old table as old_rows
+       for each statement execute procedure albion.${NAME}_section_geom_cache_${NAME}_fct()
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_${NAME}_truncate_trig on _albion.${NAME}
+;
+
+create trigger ${NAME}_section_geom_cache_${NAME}_truncate_trig
+    after truncate on _albion.${NAME}
+       for each statement execute procedure albion.${NAME}_section_geom_cache_${NAME}_fct()
+;
+
+-- collars and trajectories of holes change their projected intervals and the sections
+-- they are on, new holes have no interval yet
+create or replace function albion.${NAME}_section_geom_cache_hole_fct()
+returns trigger
+language plpgsql
+as
+$$$$
+    declare
+        ids varchar[];
+    begin
+        if tg_op = 'TRUNCATE' then
+            delete from albion.${NAME}_section_geom_cache;
+            return null;
+        elsif tg_op = 'DELETE' then
+            select array_agg(id) into ids from old_rows;
+        else
+            select array_agg(id) into ids from (select id from old_rows union select id from new_rows) as t;
+        end if;
+        if ids is not null then
+            perform albion.${NAME}_section_geom_cache_update(ids, null);
+        end if;
+        return null;
+    end;
+$$$$
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_hole_update_trig on _albion.hole
+;
+
+create trigger ${NAME}_section_geom_cache_hole_update_trig
+    after update on _albion.hole
+       referencing old table as old_rows new table as new_rows
+       for each statement execute procedure albion.${NAME}_section_geom_cache_hole_fct()
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_hole_delete_trig on _albion.hole
+;
+
+create trigger ${NAME}_section_geom_cache_hole_delete_trig
+    after delete on _albion.hole
+       referencing old table as old_rows
+       for each statement execute procedure albion.${NAME}_section_geom_cache_hole_fct()
+;
+
+drop trigger if exists ${NAME}_section_geom_cache_hole_truncate_trig on _albion.hole
+;
+
+create trigger ${NAME}_section_geom_cache_hole_truncate_trig
+    after truncate on _albion.hole
+       for each statement execute procedure albion.${NAME}_section_geom_cache_hole_fct()
+;
+
+select albion.${NAME}_section_geom_cache_refresh()
+;
 
 create view albion.${NAME}_section as
 select row_number() over() as id, t.id as ${NAME}_id, sc.section_id, t.hole_id, sc.geom::geometry('LINESTRING', ${SRID}), ${T_FIELDS}
 from _albion.${NAME} as t
 join albion.${NAME}_section_geom_cache as sc on sc.${NAME}_id = t.id
-join _albion.section as s on st_intersects(s.geom, sc.collar) and sc.section_id = s.id
+join _albion.section as s on s.id=sc.section_id and sc.section_hash=albion.section_hash(s.geom, s.anchor, s.scale)
 ;
 
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+"""
+Batch desurvey of holes
+
+Computes the trajectories of all holes at once with the same formulas (and
+the same single precision intermediate values) as the sql function
+albion.hole_geom, the completion of the trajectories (collar, extension to
+the hole depth) is left to albion.complete_hole_geom
+"""
+
+import struct
+import numpy
+
+
+def desurvey(collars, deviations):
+    """
+    collars: dict hole_id -> (x, y, z)
+    deviations: list of tuples (hole_id, from_, dip, azimuth)
+
+    returns a dict hole_id -> (n, 3) array of trajectory points (collar not
+    included) for each hole that has valid deviations
+    """
+    deviations = [
+        d
+        for d in deviations
+        if d[0] in collars
+        and None not in d
+        and 0 <= d[3] <= 360
+        and -180 < d[2] < 0
+    ]
+    if not len(deviations):
+        return {}
+
+    ids = list(collars.keys())
+    index = {id_: i for i, id_ in enumerate(ids)}
+    hole = numpy.array([index[d[0]] for d in deviations])
+    from_ = numpy.array([d[1] for d in deviations], dtype=numpy.float32)
+    dip = numpy.array([d[2] for d in deviations], dtype=numpy.float32)
+    azimuth = numpy.array([d[3] for d in deviations], dtype=numpy.float32)
+
+    order = numpy.lexsort((from_, hole))
+    hole, from_, dip, azimuth = hole[order], from_[order], dip[order], azimuth[order]
+    first = numpy.ones(len(hole), dtype=bool)
+    first[1:] = hole[1:] != hole[:-1]
+
+    # deviation columns are real, differences and dip shift are done in single precision
+    md2 = from_
+    md1 = numpy.where(first, numpy.float32(0), numpy.roll(md2, 1))
+    wd2 = (dip + numpy.float32(90)).astype(numpy.float64) * numpy.pi / 180
+    wd1 = numpy.where(first, 0, numpy.roll(wd2, 1))
+    haz2 = azimuth.astype(numpy.float64) * numpy.pi / 180
+    haz1 = numpy.where(first, 0, numpy.roll(haz2, 1))
+    half_length = 0.5 * (md2 - md1).astype(numpy.float64)
+
+    dx = half_length * (numpy.sin(wd1) * numpy.sin(haz1) + numpy.sin(wd2) * numpy.sin(haz2))
+    dy = half_length * (numpy.sin(wd1) * numpy.cos(haz1) + numpy.sin(wd2) * numpy.cos(haz2))
+    dz = half_length * (numpy.cos(wd2) + numpy.cos(wd1))
+
+    # rows with the same md1 are peers in the sql window, they all get the
+    # cumulated sum of the last one
+    last_peer = numpy.ones(len(hole), dtype=bool)
+    last_peer[:-1] = (hole[1:] != hole[:-1]) | (md1[1:] != md1[:-1])
+    peer = numpy.minimum.accumulate(
+        numpy.where(last_peer, numpy.arange(len(hole)), len(hole))[::-1]
+    )[::-1]
+
+    starts = numpy.flatnonzero(first)
+    ends = numpy.append(starts[1:], len(hole))
+    trajectories = {}
+    for start, end in zip(starts, ends):
+        x, y, z = collars[ids[hole[start]]]
+        # cumsum sums sequentially, like sql window aggregates
+        points = numpy.column_stack((
+            x + numpy.cumsum(dx[start:end]),
+            y + numpy.cumsum(dy[start:end]),
+            z - numpy.cumsum(dz[start:end]),
+        ))
+        trajectories[ids[hole[start]]] = points[peer[start:end] - start]
+    return trajectories
+
+
+def linestring_ewkb(points, srid):
+    "EWKB of a LINESTRINGZ, points is a (n, 3) array"
+    return struct.pack("<BIII", 1, 0xA0000002, srid, len(points)) + numpy.ascontiguousarray(
+        points, dtype="<f8"
+    ).tobytes()
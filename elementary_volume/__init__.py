@@ -5,22 +5,299 @@ from builtins import zip
 from builtins import range
 from builtins import object
 import os
+import time
+import struct
+import numpy
 import random
 from itertools import combinations
 from math import pi as PI, inf as INF, sin
-from numpy import array, cross, argmin, argmax, dot, average
+from numpy import array, cross, argmin, argmax, dot, average, flatnonzero
 from numpy.linalg import norm
-from collections import defaultdict
+from collections import defaultdict, Counter
 from itertools import product
 from shapely.geometry import MultiPolygon, Polygon, LineString, MultiLineString, Point, MultiPoint
 from shapely import wkb
 from shapely.ops import unary_union, polygonize
 from shapely.ops import transform 
+from shapely.prepared import prep
 from shapely import geos
 from shapely.affinity import translate
 geos.WKBWriter.defaults['include_srid'] = True
 
-from fourmy import tessellate
+class BuildStats(object):
+    """time spent in each phase of elementary_volumes (in seconds) and
+    counts of its inputs and outputs"""
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.__last = time.time()
+
+    def lap(self, phase):
+        "adds the time elapsed since the previous lap to phase"
+        now = time.time()
+        self.times[phase] += now - self.__last
+        self.__last = now
+
+    def resume(self):
+        "starts a new lap, the time elapsed since the previous lap is not counted"
+        self.__last = time.time()
+
+def is_closed(triangles):
+    "every edge is shared by two triangles with opposite orientations"
+    edges = Counter()
+    for p in triangles:
+        for s, e in zip(p.exterior.coords[:-1], p.exterior.coords[1:]):
+            if edges[(e, s)]:
+                edges[(e, s)] -= 1
+            else:
+                edges[(s, e)] += 1
+    return not any(edges.values())
+
+# EWKB of a polygon with one ring of 4 points, the layout of the triangles of volumes
+WKB_TRIANGLE = numpy.dtype([('order', 'u1'), ('type', '<u4'), ('rings', '<u4'), ('points', '<u4'), ('coords', '<f8', (4, 3))])
+WKB_Z = 0x80000000
+WKB_SRID = 0x20000000
+
+WKB_SEGMENT = numpy.dtype([('order', 'u1'), ('type', '<u4'), ('points', '<u4'), ('coords', '<f8', (2, 3))])
+
+# header of packed meshes: srid, number of vertices, number of triangles
+MESH_HEADER = struct.Struct('<iII')
+
+def load_wkb(geom):
+    "shapely geometry of an EWKB given as bytes (bytea) or hex (geometry)"
+    return wkb.loads(bytes.fromhex(geom) if isinstance(geom, str) else bytes(geom))
+
+def empty_wkb(srid):
+    "EWKB of an empty MULTIPOLYGONZ"
+    return struct.pack('<BIiI', 1, WKB_Z | WKB_SRID | 6, srid, 0)
+
+def triangle_coords(multipoly):
+    """srid and (n, 3, 3) array of the coordinates of the triangles of a
+    MULTIPOLYGONZ (EWKB, as bytes or hex), raises ValueError if a polygon is
+    not a triangle"""
+    data = bytes.fromhex(multipoly) if isinstance(multipoly, str) else bytes(multipoly)
+    if data[0] == 1:
+        type_, = struct.unpack_from('<I', data, 1)
+        if type_ & WKB_SRID:
+            srid, = struct.unpack_from('<i', data, 5)
+            offset = 9
+        else:
+            srid = 0
+            offset = 5
+        count, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        if (type_ & 0xff) == 6 and type_ & WKB_Z and len(data) == offset + count*WKB_TRIANGLE.itemsize:
+            polygons = numpy.frombuffer(data, WKB_TRIANGLE, count, offset)
+            if numpy.all((polygons['order'] == 1) & (polygons['type'] == WKB_Z | 3)
+                    & (polygons['rings'] == 1) & (polygons['points'] == 4)):
+                return srid, polygons['coords'][:, :3]
+    # other encodings, polygons that are not triangles are not supported
+    m = wkb.loads(data)
+    polygons = list(getattr(m, 'geoms', [m]))
+    for p in polygons:
+        if len(p.interiors) or len(p.exterior.coords) != 4:
+            raise ValueError("polygon is not a triangle: {}".format(p.wkt))
+    return geos.lgeos.GEOSGetSRID(m._geom), \
+        array([p.exterior.coords[:3] for p in polygons], dtype=numpy.float64).reshape((-1, 3, 3))
+
+def triangles_wkb(coords, srid):
+    "hex EWKB of the MULTIPOLYGONZ of (n, 3, 3) triangle coordinates"
+    polygons = numpy.zeros(len(coords), WKB_TRIANGLE)
+    polygons['order'] = 1
+    polygons['type'] = WKB_Z | 3
+    polygons['rings'] = 1
+    polygons['points'] = 4
+    polygons['coords'] = coords[:, [0, 1, 2, 0]]
+    return (struct.pack('<BIiI', 1, WKB_Z | WKB_SRID | 6, srid, len(coords)) + polygons.tobytes()).hex()
+
+def segments_wkb(coords, srid):
+    "hex EWKB of the MULTILINESTRINGZ of (n, 2, 3) segment coordinates"
+    lines = numpy.zeros(len(coords), WKB_SEGMENT)
+    lines['order'] = 1
+    lines['type'] = WKB_Z | 2
+    lines['points'] = 2
+    lines['coords'] = coords
+    return (struct.pack('<BIiI', 1, WKB_Z | WKB_SRID | 5, srid, len(coords)) + lines.tobytes()).hex()
+
+# mesh kernel, meshes are (n, 3) vertices and (m, 3) triangles (vertex indices)
+
+def weld(coords, decimals=None):
+    """vertices and triangles of (m, 3, 3) triangle coordinates, coordinates
+    are rounded to decimals (if not None) before merging equal vertices"""
+    if decimals is not None:
+        coords = numpy.round(coords, decimals)
+    vertices, triangles = numpy.unique(coords.reshape((-1, 3)), axis=0, return_inverse=True)
+    return vertices, triangles.reshape((-1, 3))
+
+def edge_balance(triangles, nb_vertices):
+    """(k, 2) undirected edges (i < j) of triangles and, for each, the number
+    of triangles that go along i->j minus the number that go along j->i,
+    zero length edges are ignored"""
+    edges = numpy.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]))
+    edges = edges[edges[:, 0] != edges[:, 1]].astype(numpy.int64)
+    low, high = edges.min(axis=1), edges.max(axis=1)
+    keys, inverse = numpy.unique(low*nb_vertices + high, return_inverse=True)
+    balance = numpy.bincount(inverse.ravel(), numpy.where(edges[:, 0] < edges[:, 1], 1, -1), len(keys))
+    return numpy.column_stack((keys // nb_vertices, keys % nb_vertices)), balance.astype(numpy.int64)
+
+def signed_volume(coords):
+    "signed volume enclosed by (m, 3, 3) triangle coordinates"
+    if not len(coords):
+        return 0.
+    # the sum of det(a, b, c) is computed relative to the first vertex,
+    # coordinates are too large for an accurate sum of products
+    origin = coords[0, 0]
+    a, b, c = coords[:, 0] - origin, coords[:, 1] - origin, coords[:, 2] - origin
+    normals = numpy.cross(b - a, c - a)
+    return (numpy.einsum('ij,ij->', a, numpy.cross(b, c)) + dot(origin, normals.sum(axis=0)))/6.
+
+def mesh_boundary(vertices, triangles):
+    """(k, 2, 3) coordinates of the edges of triangles that are not cancelled by
+    an edge in the opposite direction, the mesh is closed if there is none"""
+    edges, balance = edge_balance(triangles, len(vertices))
+    edges = numpy.where((balance > 0)[:, None], edges, edges[:, ::-1])[balance != 0]
+    # zero length edges cancel each other
+    degenerate = numpy.concatenate((triangles[:, 0][triangles[:, 0] == triangles[:, 1]],
+        triangles[:, 1][triangles[:, 1] == triangles[:, 2]], triangles[:, 2][triangles[:, 2] == triangles[:, 0]]))
+    odd = flatnonzero(numpy.bincount(degenerate, minlength=len(vertices)) % 2)
+    return vertices[numpy.concatenate((edges, numpy.column_stack((odd, odd)))).astype(numpy.int64)]
+
+def exterior_triangles(triangles):
+    """triangles that are not cancelled by a triangle with the same vertices
+    and the opposite orientation (in the order they first appear), degenerate
+    triangles are dropped"""
+    triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+                          & (triangles[:, 2] != triangles[:, 0])]
+    # rotate the smallest index first, orientation is then given by the order of the others
+    first = numpy.argmin(triangles, axis=1)
+    rotated = triangles[numpy.arange(len(triangles))[:, None], (first[:, None] + numpy.arange(3)) % 3]
+    direct = rotated[:, 1] < rotated[:, 2]
+    canonical = numpy.where(direct[:, None], rotated, rotated[:, [0, 2, 1]])
+    keys, index, inverse = numpy.unique(canonical, axis=0, return_index=True, return_inverse=True)
+    balance = numpy.bincount(inverse.ravel(), numpy.where(direct, 1, -1), len(keys))
+    order = numpy.argsort(index)
+    keys, balance = keys[order], balance[order]
+    return numpy.where((balance > 0)[:, None], keys, keys[:, [0, 2, 1]])[balance != 0]
+
+def to_mesh(multipoly):
+    """packs the triangles of a MULTIPOLYGONZ (EWKB, as bytes or hex) as an
+    indexed mesh: MESH_HEADER followed by the deduplicated vertices (float64
+    x, y, z) and the triangles (int32 vertex indices), little endian"""
+    srid, coords = triangle_coords(multipoly)
+    return pack_mesh(srid, *weld(coords))
+
+def pack_mesh(srid, vertices, triangles):
+    "packed mesh of (n, 3) vertices and (m, 3) triangles"
+    return MESH_HEADER.pack(srid, len(vertices), len(triangles)) \
+        + numpy.ascontiguousarray(vertices, dtype='<f8').tobytes() \
+        + numpy.ascontiguousarray(triangles, dtype='<i4').tobytes()
+
+def from_mesh(mesh):
+    "srid, (n, 3) vertices and (m, 3) triangles of a packed mesh"
+    mesh = bytes(mesh)
+    srid, nb_vertices, nb_triangles = MESH_HEADER.unpack_from(mesh)
+    vertices = numpy.frombuffer(mesh, '<f8', 3*nb_vertices, MESH_HEADER.size).reshape((-1, 3))
+    triangles = numpy.frombuffer(mesh, '<i4', 3*nb_triangles, MESH_HEADER.size + 24*nb_vertices).reshape((-1, 3))
+    return srid, vertices, triangles
+
+def mesh_to_wkb(mesh):
+    "hex EWKB of the MULTIPOLYGONZ of the triangles of a packed mesh"
+    srid, vertices, triangles = from_mesh(mesh)
+    return triangles_wkb(vertices[triangles], srid)
+
+class VolumeUnion(object):
+    """union of volumes added one at a time (as packed meshes): triangles of a
+    volume cancel the triangles with the same vertices and the opposite
+    orientation of the volumes already added, as in volume_union, so only
+    the triangles that are not cancelled yet are kept in memory"""
+    def __init__(self, decimals=6):
+        self.decimals = decimals
+        self.srid = 0
+        # canonical triangle coordinates (as bytes) -> orientation balance
+        self.balance = {}
+
+    def add(self, mesh):
+        srid, vertices, triangles = from_mesh(mesh)
+        self.srid = srid
+        # unique sorts vertices, so the order of the indices of a triangle is
+        # the order of its coordinates and canonical triangles are global
+        vertices, index = numpy.unique(numpy.round(vertices, self.decimals), axis=0, return_inverse=True)
+        triangles = exterior_triangles(index.ravel()[triangles])
+        direct = triangles[:, 1] < triangles[:, 2]
+        canonical = numpy.where(direct[:, None], triangles, triangles[:, [0, 2, 1]])
+        balance = self.balance
+        for key, sign in zip(numpy.ascontiguousarray(vertices[canonical]).reshape((-1, 9)), numpy.where(direct, 1, -1)):
+            key = key.tobytes()
+            b = balance.pop(key, 0) + sign
+            if b:
+                balance[key] = b
+
+    def coords(self):
+        "(n, 3, 3) coordinates of the triangles of the union"
+        if not len(self.balance):
+            return numpy.zeros((0, 3, 3))
+        coords = numpy.frombuffer(b''.join(self.balance.keys()), numpy.float64).reshape((-1, 3, 3))
+        return numpy.where((numpy.fromiter(self.balance.values(), numpy.int64, len(self.balance)) > 0)[:, None, None],
+            coords, coords[:, [0, 2, 1]])
+
+    def wkb(self):
+        "hex EWKB of the union"
+        return triangles_wkb(self.coords(), self.srid)
+
+    def mesh(self):
+        "packed mesh of the union"
+        return pack_mesh(self.srid, *weld(self.coords()))
+
+# functions of the same name in the albion schema, geometries are EWKB (bytes
+# for bytea arguments, hex for geometry arguments)
+
+def volume_of_geom(multipoly):
+    return signed_volume(triangle_coords(multipoly)[1])
+
+def is_closed_volume(multipoly):
+    srid, coords = triangle_coords(multipoly)
+    return len(mesh_boundary(*weld(coords))) == 0
+
+def volume_metrics(multipoly):
+    "closedness and volume of a MULTIPOLYGONZ"
+    srid, coords = triangle_coords(multipoly)
+    return len(mesh_boundary(*weld(coords))) == 0, signed_volume(coords)
+
+def mesh_metrics(mesh):
+    """closedness, volume, number of triangles and bounding box (BOX3D text)
+    of a packed mesh, its vertices are already merged"""
+    srid, vertices, triangles = from_mesh(mesh)
+    if not len(triangles):
+        return False, 0., 0, None
+    bbox = 'BOX3D({} {} {},{} {} {})'.format(*[repr(float(x)) for x in numpy.concatenate((vertices.min(axis=0), vertices.max(axis=0)))])
+    return len(mesh_boundary(vertices, triangles)) == 0, signed_volume(vertices[triangles]), len(triangles), bbox
+
+def mesh_to_obj(mesh):
+    "wavefront obj of a packed mesh"
+    srid, vertices, triangles = from_mesh(mesh)
+    return ''.join(["v %f %f %f\n" % tuple(v) for v in vertices]
+        + ["f %d %d %d\n" % tuple(t) for t in triangles + 1])
+
+def mesh_boundarie(multipoly):
+    srid, coords = triangle_coords(multipoly)
+    return segments_wkb(mesh_boundary(*weld(coords)), srid)
+
+def volume_union(multipoly):
+    "triangles of multipoly that are not shared by two volumes (vertices closer than 1e-6 are merged)"
+    srid, coords = triangle_coords(multipoly)
+    vertices, triangles = weld(coords, 6)
+    return triangles_wkb(vertices[exterior_triangles(triangles)], srid)
+
+def triangle_intersection(t1_, t2_):
+    "triangles of t1_ that are in t2_ with the opposite orientation, None if there is none"
+    srid, t1 = triangle_coords(t1_)
+    t2 = triangle_coords(t2_)[1][:, ::-1]
+    row = numpy.dtype((numpy.void, 9*8))
+    common = numpy.intersect1d(numpy.ascontiguousarray(t1.reshape((-1, 9))).view(row),
+                               numpy.ascontiguousarray(t2.reshape((-1, 9))).view(row))
+    if not len(common):
+        return None
+    return triangles_wkb(common.view(numpy.float64).reshape((-1, 3, 3)), srid)
 
 def to_vtk(multiline):
     if multiline is None:
@@ -103,11 +380,52 @@ def share_an_edge(t, f):
     return 2 == len(set([tuple(x) for x in t.exterior.coords[:3]]
         ).intersection(set([tuple(x) for x in f.exterior.coords[:3]])))
 
+class EdgeIndex(object):
+    """triangles indexed by their pairs of vertices, has_shared_edge(t) is
+    equivalent to any(share_an_edge(t, f) for f in triangles) without
+    comparing t to every triangle"""
+    def __init__(self, triangles):
+        self.index = defaultdict(list)
+        for f in triangles:
+            vtx = frozenset(tuple(x) for x in f.exterior.coords[:3])
+            for pair in combinations(vtx, 2):
+                self.index[frozenset(pair)].append(vtx)
+
+    def has_shared_edge(self, t):
+        vtx = frozenset(tuple(x) for x in t.exterior.coords[:3])
+        for pair in combinations(vtx, 2):
+            for f in self.index.get(frozenset(pair), []):
+                if len(vtx & f) == 2:
+                    return True
+        return False
+
 def face_edge_intersects(segment, crossing_segment):
     A, B, C, D = array(segment[0]), array(segment[1]), array(crossing_segment[0]), array(crossing_segment[1])
     return dot(cross(D-C, A-C), cross(D-C, B-C)) < 0
 
 
+def crossing_pairs(lines):
+    """generates the pairs (i, j) of combinations(range(len(lines)), 2) for which
+    sym_split splits the lines, i.e. lines whose ends are crossing in altitude
+
+    the caller may split the lines of the last pair generated, ends are read again
+    before looking for the next pair
+    """
+    start = array([l.points[0][2] for l in lines])
+    end = array([l.points[-1][2] for l in lines])
+    for i in range(len(lines)):
+        j = i + 1
+        while j < len(lines):
+            crossing = flatnonzero(((start[i] < start[j:]) & (end[i] > end[j:]))
+                                 | ((start[i] > start[j:]) & (end[i] < end[j:])))
+            if not len(crossing):
+                break
+            j += crossing[0]
+            yield i, j
+            for k in (i, j):
+                start[k], end[k] = lines[k].points[0][2], lines[k].points[-1][2]
+            j += 1
+
 class Line(object):
     VERTICAL='vertical'
     TOP='top'
@@ -195,17 +513,35 @@ def offset_coords(offsets, coords):
     return [offsets[c] if c in offsets else c for c in coords]
 
 
-def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end_ids_, end_geoms_, end_holes_, srid_=32632, end_node_relative_distance=0.3, end_node_relative_thickness=.3):
+def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end_ids_, end_geoms_, end_holes_, srid_=32632, end_node_relative_distance=0.3, end_node_relative_thickness=.3, stats=None, binary=False):
+    """generates the volumes of a cell (and their faces on the cell sides)
+
+    node and end node geometries are EWKB (bytes or hex), volumes and faces are
+    hex EWKB, or bytes if binary is True
+
+    stats, if provided, is a BuildStats that is filled with the timings of the
+    build phases and counts, the time spent by the caller between volumes is not
+    counted, nothing is measured without stats
+    """
+
+    # fourmy (CGAL) is only installed for the plpython backend, the rest of
+    # the module (mesh kernel, VolumeUnion, to_obj) is also used by the plugin
+    from fourmy import tessellate
 
     DEBUG = False
     PRECI = 6
     debug_files = []
+    if stats is not None:
+        stats.resume()
+        stats.counts['nodes'] += len(node_ids_)
+        stats.counts['edges'] += len(starts_)
+        stats.counts['end_nodes'] += len(end_ids_)
 
-    nodes = {id_: wkb.loads(bytes.fromhex(geom)) for id_, geom in zip(node_ids_, nodes_)}
+    nodes = {id_: load_wkb(geom) for id_, geom in zip(node_ids_, nodes_)}
     ends = defaultdict(list)
     end_holes = defaultdict(list)
     for id_, geom, hole_id in zip(end_ids_, end_geoms_, end_holes_):
-        ends[id_].append(wkb.loads(bytes.fromhex(geom)))
+        ends[id_].append(load_wkb(geom))
         end_holes[id_].append(hole_id)
     holes = {n: h for n, h in zip(node_ids_, hole_ids_)}
     edges = [(s, e) for s, e in zip(starts_, ends_)]
@@ -230,6 +566,8 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
     for e in edges:
         graph[e[0]].add(e[1])
         graph[e[1]].add(e[0])
+    if stats is not None:
+        stats.lap('parse')
 
     # two connected edges form a ring
     # /!\ do not do that for complex trousers configuration, this will
@@ -304,8 +642,8 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
             face_lines.append(Line([nodes[e[0]].coords[1], nodes[e[1]].coords[1]], Line.BOTTOM))
 
         # split lines 
-        for i, j in combinations(list(range(len(face_lines))), 2):
-            assert(face_lines[i].side != Line.VERTICAL and face_lines[j].side != Line.VERTICAL)
+        assert(all(l.side != Line.VERTICAL for l in face_lines))
+        for i, j in crossing_pairs(face_lines):
             p = sym_split(face_lines[i].points, face_lines[j].points)
             if p and p not in offsets:
                 if face_lines[i].points[0] in offsets and face_lines[i].points[-1] in offsets\
@@ -394,18 +732,24 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
         domain = unary_union([Polygon([(round(dot(p-origin, v), PRECI), round(dot(p-origin, z), PRECI))
                 for p in array(dom.exterior.coords)]) for dom in domain])
 
+        prepared_domain = prep(domain)
         polygons = list(polygonize(linework))
         domain_tri = []
         term_tri = []
         for p in polygons:
             p = p if p.exterior.is_ccw else Polygon(p.exterior.coords[::-1])
             assert(p.exterior.is_ccw)
-            for t in tessellate(p):
+            if stats is not None:
+                stats.lap('faces')
+            tessellation = tessellate(p)
+            if stats is not None:
+                stats.lap('tessellation')
+            for t in tessellation:
                 tri = t.exterior.coords
                 q = Polygon([node_map[tri[0]], node_map[tri[1]], node_map[tri[2]]]) \
                     if direct_orientation else \
                     Polygon([node_map[tri[2]], node_map[tri[1]], node_map[tri[0]]])
-                if Point(average(tri, (0,))).intersects(domain):
+                if prepared_domain.intersects(Point(average(tri, (0,)))):
                     domain_tri.append(q)
                 else:
                     term_tri.append(q)
@@ -431,13 +775,9 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
                     edges.remove((e, s))
                 else:
                     edges.add((s, e))
+        domain_edges = EdgeIndex(domain_tri)
         for t in term_tri:
-            share = False
-            for d in domain_tri:
-                if share_an_edge(t, d):
-                    share = True
-                    break
-            if share:
+            if domain_edges.has_shared_edge(t):
                 continue
             terms.append(t)
             faces[(hl, hr)] += [t]
@@ -454,6 +794,9 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
                         faces[tuple(sorted((end_lines[(s[1], s[0])], other_hole)))] += terms[-2:]
         termination += terms
 
+    if stats is not None:
+        stats.lap('faces')
+
     if DEBUG:
         open("/tmp/faces.obj", 'w').write(to_obj(MultiPolygon(result).wkb_hex))
         open("/tmp/termination.obj", 'w').write(to_obj(MultiPolygon(termination).wkb_hex))
@@ -496,7 +839,12 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
                     p = Polygon([(round(x[0], PRECI), round(x[1], PRECI)) for x in m])
                     p = p if p.exterior.is_ccw else Polygon(p.exterior.coords[::-1])
                     assert(p.exterior.is_ccw)
-                    for t in tessellate(p):
+                    if stats is not None:
+                        stats.lap('closing')
+                    tessellation = tessellate(p)
+                    if stats is not None:
+                        stats.lap('tessellation')
+                    for t in tessellation:
                         tri = t.exterior.coords
                         q = Polygon([node_map[tri[0]], node_map[tri[1]], node_map[tri[2]]]) \
                             if face == 'bottom' else \
@@ -544,49 +892,49 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
             open("/tmp/face_{}_{}.obj".format(hp[0], hp[1]), 'w').write(to_obj(MultiPolygon([t for t in tri]).wkb_hex))
 
 
-    # decompose volume in connected components
+    if stats is not None:
+        stats.lap('closing')
+
+    # decompose volume in connected components of triangles sharing an edge,
+    # the root of a component is its smallest triangle index
+    parent = list(range(len(result)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
     edges = {}
-    graph = {i:set() for i in range(len(result))}
     for ip, p in enumerate(result):
         for s, e in zip(p.exterior.coords[:-1], p.exterior.coords[1:]):
             if (e, s) in edges:
-                o = edges[(e,s)]
-                graph[o].add(ip)
-                graph[ip].add(o)
-                del edges[(e, s)]
+                r1, r2 = find(ip), find(edges.pop((e, s)))
+                if r1 != r2:
+                    parent[max(r1, r2)] = min(r1, r2)
             else:
                 edges[(s, e)] = ip
 
-    def pop_connected(n, graph):
-        connected = set([n])
-        if n in graph:
-            for ng in graph.pop(n):
-                connected = connected.union(pop_connected(ng, graph))
-        return connected
-
-    connected = []
-    while len(graph):
-        n = next(iter(list(graph.keys())))
-        connected.append(pop_connected(n, graph))
+    connected = defaultdict(list)
+    for ip in range(len(result)):
+        connected[find(ip)].append(ip)
+    if stats is not None:
+        stats.counts['volumes'] += len(connected)
+        stats.counts['triangles'] += len(result)
 
     i=0
-    for c in connected:
+    for c in connected.values():
         i+=1
-        face1 = []
-        face2 = []
-        face3 = []
         triangles = [result[i] for i in c]
         res = MultiPolygon(triangles)
-        
-        for f in faces[(sorted_holes[0], sorted_holes[1])]:
-            if f in triangles:
-                face1.append(f)
-        for f in faces[(sorted_holes[1], sorted_holes[2])]:
-            if f in triangles:
-                face2.append(f)
-        for f in faces[(sorted_holes[0], sorted_holes[2])]:
-            if f in triangles:
-                face3.append(f)
+        if stats is not None:
+            stats.counts['open_volumes'] += not is_closed(triangles)
+
+        # polygons are equal if their rings are
+        keys = set(tuple(t.exterior.coords) for t in triangles)
+        face1 = [f for f in faces[(sorted_holes[0], sorted_holes[1])] if tuple(f.exterior.coords) in keys]
+        face2 = [f for f in faces[(sorted_holes[1], sorted_holes[2])] if tuple(f.exterior.coords) in keys]
+        face3 = [f for f in faces[(sorted_holes[0], sorted_holes[2])] if tuple(f.exterior.coords) in keys]
         
         if DEBUG:
             open("/tmp/face1_tr_%d.obj"%(i), 'w').write(to_obj(face1.wkb_hex))
@@ -632,9 +980,18 @@ def elementary_volumes(holes_, starts_, ends_, hole_ids_, node_ids_, nodes_, end
         face3 = translate(MultiPolygon(face3), translation[0], translation[1], translation[2])
         geos.lgeos.GEOSSetSRID(face3._geom, srid_)
         
-        empty_mp = "SRID={} ;MULTIPOLYGONZ EMPTY".format(srid_)
-        yield (res.wkb_hex if not res.is_empty else empty_mp, face1.wkb_hex if not face1.is_empty else empty_mp, 
-            face2.wkb_hex if not face2.is_empty else empty_mp, face3.wkb_hex if not face3.is_empty else empty_mp)
+        if binary:
+            empty_mp = empty_wkb(srid_)
+            volume = tuple(g.wkb if not g.is_empty else empty_mp for g in (res, face1, face2, face3))
+        else:
+            empty_mp = "SRID={} ;MULTIPOLYGONZ EMPTY".format(srid_)
+            volume = (res.wkb_hex if not res.is_empty else empty_mp, face1.wkb_hex if not face1.is_empty else empty_mp, 
+                face2.wkb_hex if not face2.is_empty else empty_mp, face3.wkb_hex if not face3.is_empty else empty_mp)
+        if stats is not None:
+            stats.lap('components')
+        yield volume
+        if stats is not None:
+            stats.resume()
 
     for f in debug_files:
         os.remove(f)
@@ -0,0 +1,137 @@
+"""
+Benchmark of the elementary volume builder
+
+Replays the input dumps of a corpus directory (test_data by default) through
+elementary_volumes, reports the time, number of triangles and closedness of
+the volumes of each cell and compares the output with the golden file stored
+next to each dump (<dump>.json).
+
+Dumps are captured from a project with Project.export_elementary_volume_inputs,
+golden files are (re)written with --update. The output of the builder depends
+on the iteration order of sets of node ids, the benchmark runs with a fixed
+PYTHONHASHSEED so that it can be compared between runs.
+
+Golden files record the number of triangles, closedness and volume of each
+volume and its faces rather than their exact geometry: the order of the
+triangles given by fourmy may change with the version of CGAL it is built on.
+They are meant for fourmy 0.0.5 (the version loaded by albion.sql) built on
+CGAL 5 with gmp/mpfr; regenerate them with --update if fourmy or CGAL changes.
+
+test_data has dumps of production cells (input*.txt) and of synthetic hard
+cells: trousers (a node connected to two nodes of another hole), terminations
+(end nodes) and nodes of a child graph (end nodes oriented by the edges of
+their parent nodes).
+
+usage: python -m elementary_volume.benchmark [--update] [--repeat N] [dump_or_dir ...]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from shapely import wkb
+
+from . import elementary_volumes, is_closed, volume_of_geom
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+def read_input(filename):
+    """reads a dump (one line per argument of albion.elementary_volumes, the
+    last line with srid, end_node_relative_distance and end_node_relative_thickness
+    is optional) and returns the cell id and the arguments of elementary_volumes"""
+    with open(filename) as f:
+        lines = [l.rstrip('\n') for l in f]
+    # trailing empty arrays may have no line
+    lines += [''] * (12 - len(lines))
+    cell_id_ = lines[0]
+    args = [l.split() for l in lines[3:12]]
+    if len(lines) > 12 and lines[12].strip():
+        srid_, distance, thickness = lines[12].split()
+        args += [int(srid_), float(distance), float(thickness)]
+    return cell_id_, args
+
+
+def triangle_count(hex_):
+    # empty volumes are returned as EWKT
+    return 0 if hex_.startswith('SRID=') else len(wkb.loads(hex_, hex=True).geoms)
+
+
+def volume_report(hex_, faces):
+    "number of triangles, closedness and volume of a volume returned by elementary_volumes"
+    if hex_.startswith('SRID='):
+        return {'triangles': 0, 'closed': False, 'volume': 0., 'faces': [triangle_count(f) for f in faces]}
+    geom = wkb.loads(hex_, hex=True)
+    return {
+        'triangles': len(geom.geoms),
+        'closed': is_closed(geom.geoms),
+        'volume': round(float('{:.6g}'.format(volume_of_geom(hex_))), 3),
+        'faces': [triangle_count(f) for f in faces]
+        }
+
+
+def run(filename, repeat=1):
+    """returns the best time of repeat runs and the report of each volume built
+    for the cell (sorted, the order of volumes is not significant)"""
+    cell_id_, args = read_input(filename)
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        volumes = list(elementary_volumes(*args))
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sorted((volume_report(v, (f1, f2, f3)) for v, f1, f2, f3 in volumes),
+        key=lambda r: (r['triangles'], r['volume'], r['faces']))
+
+
+def corpus(paths):
+    files = []
+    for p in paths:
+        files += sorted(glob.glob(os.path.join(p, '*.txt'))) if os.path.isdir(p) else [p]
+    return files
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="benchmark of the elementary volume builder")
+    parser.add_argument('paths', nargs='*', default=[CORPUS], help="dumps or directories of dumps")
+    parser.add_argument('--update', action='store_true', help="write the golden files")
+    parser.add_argument('--repeat', type=int, default=1, help="number of runs per cell (best time is reported)")
+    args = parser.parse_args(argv)
+
+    total = 0
+    failures = 0
+    print("{:<30} {:>10} {:>8} {:>10} {:>7}  {}".format('dump', 'time (ms)', 'volumes', 'triangles', 'closed', 'golden'))
+    for filename in corpus(args.paths):
+        elapsed, volumes = run(filename, args.repeat)
+        total += elapsed
+        golden = os.path.splitext(filename)[0] + '.json'
+        if args.update:
+            with open(golden, 'w') as f:
+                json.dump(volumes, f, indent=1)
+            status = 'updated'
+        elif not os.path.exists(golden):
+            status = 'missing'
+        else:
+            with open(golden) as f:
+                expected = json.load(f)
+            if expected == volumes:
+                status = 'ok'
+            else:
+                status = 'DIFFERENT'
+                failures += 1
+        print("{:<30} {:>10.1f} {:>8} {:>10} {:>7}  {}".format(
+            os.path.basename(filename), 1000*elapsed, len(volumes),
+            sum(v['triangles'] for v in volumes),
+            "{}/{}".format(sum(v['closed'] for v in volumes), len(volumes)),
+            status))
+    print("total {:.1f}ms".format(1000*total))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if os.environ.get('PYTHONHASHSEED') != '0':
+        os.execve(sys.executable, [sys.executable, '-m', 'elementary_volume.benchmark'] + sys.argv[1:],
+            dict(os.environ, PYTHONHASHSEED='0'))
+    sys.exit(main(sys.argv[1:]))
@@ -211,6 +211,13 @@ class Plugin(QObject):
             "Create Delaunay triangulation of collar layer.",
         )
 
+        self.__add_menu_entry(
+            "Update cells",
+            self.__update_cells,
+            self.project is not None and self.project.has_cell,
+            "Update the triangulation after collars or section cuts changed, unchanged cells are kept.",
+        )
+
         self.__add_menu_entry(
             "Create subsections",
             self.__create_sections,
@@ -263,6 +270,13 @@ class Plugin(QObject):
             "Create volumes associated with current graph.",
         )
 
+        self.__add_menu_entry(
+            "Update volumes",
+            self.__update_volumes,
+            self.project is not None and bool(self.__current_graph.currentText()) and self.project.has_volume,
+            "Recompute volumes of cells affected by graph edits since volumes were created.",
+        )
+
         self.__add_menu_entry(
             "Export Volume",
             self.__export_volume,
@@ -330,7 +344,22 @@ class Plugin(QObject):
         self.__refresh_layers("section")
 
     def __create_volumes(self):
-        self.project.create_volumes(self.__current_graph.currentText())
+        progressMessageBar = self.__iface.messageBar().createMessage(
+            "Creating volumes..."
+        )
+        progress = QProgressBar()
+        progress.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        progressMessageBar.layout().addWidget(progress)
+        self.__iface.messageBar().pushWidget(progressMessageBar)
+
+        self.project.create_volumes(self.__current_graph.currentText(),
+                ProgressBar(progress), os.cpu_count())
+
+        self.__iface.messageBar().clearWidgets()
+        self.__viewer3d.widget().refresh_data()
+
+    def __update_volumes(self):
+        self.project.update_volumes(self.__current_graph.currentText())
         self.__viewer3d.widget().refresh_data()
 
     def __next_section(self):
@@ -546,11 +575,15 @@ class Plugin(QObject):
         progressMessageBar.layout().addWidget(progress)
         self.__iface.messageBar().pushWidget(progressMessageBar)
 
-        self.project.import_data(dir_, ProgressBar(progress))
+        errors = self.project.import_data(dir_, ProgressBar(progress))
         #self.project.triangulate()
         self.project.create_section_view_0_90(4)
 
         self.__iface.messageBar().clearWidgets()
+        if len(errors):
+            self.__iface.messageBar().pushWarning(
+                "Albion", "{} invalid lines skipped during import, see log for details".format(len(errors))
+            )
 
         collar = QgsProject.instance().mapLayersByName("collar")
         if len(collar):
@@ -710,6 +743,11 @@ class Plugin(QObject):
         self.project.triangulate(createAlbionRaster)
         self.__refresh_layers()
 
+    def __update_cells(self):
+        assert(self.project)
+        self.project.triangulate(False, incremental=True)
+        self.__refresh_layers()
+
     def __create_sections(self):
         assert(self.project)
         self.project.create_sections()
@@ -9,6 +9,8 @@ import sys
 import atexit
 import binascii
 import string
+import io
+import csv
 from qgis import processing
 from qgis.core import QgsDataSourceUri, QgsVectorLayer, QgsWkbTypes
 from shapely import wkb
@@ -29,9 +31,13 @@ from builtins import bytes
 from qgis.core import QgsMessageLog
 
 import time
-from psycopg2.extras import LoggingConnection, LoggingCursor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.extras import LoggingConnection, LoggingCursor, execute_values
 import logging
 
+from .desurvey import desurvey, linestring_ewkb
+from .elementary_volume import VolumeUnion, mesh_to_obj
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 # MyLoggingCursor simply sets self.timestamp at start of each query
@@ -84,6 +90,61 @@ TABLES = [
      'FIELDS_DEFINITION': 'level_ real, oc real, accu real, grade real, comments varchar',
      }]
 
+# number of cell batches per concurrent job when volumes are computed in parallel
+VOLUME_BATCHES_PER_JOB = 8
+
+# columns of the csv files loaded by import_data, interval files have the
+# additional fields of their table
+COLLAR_COLUMNS = [('id', 'varchar'), ('x', 'double precision'), ('y', 'double precision'),
+    ('z', 'double precision'), ('depth_', 'real'), ('date_', 'varchar'), ('comments', 'varchar')]
+DEVIATION_COLUMNS = [('hole_id', 'varchar'), ('from_', 'real'), ('dip', 'real'), ('azimuth', 'real')]
+INTERVAL_COLUMNS = [('hole_id', 'varchar'), ('from_', 'real'), ('to_', 'real')]
+
+# (name found in the csv file name, table)
+INTERVAL_FILES = [
+    ('avp', 'radiometry'),
+    ('formation', 'formation'),
+    ('lithology', 'lithology'),
+    ('facies', 'facies'),
+    ('resi', 'resistivity'),
+    ('chemical', 'chemical')]
+
+# number of csv lines sent to the database at once
+IMPORT_CHUNK_SIZE = 10000
+
+
+def parse_fields_definition(table):
+    "list of (name, type) from the FIELDS_DEFINITION of a table"
+    return [tuple(f.strip().split(None, 1)) for f in table['FIELDS_DEFINITION'].split(',')]
+
+
+def check_row(row, columns, hole_ids):
+    "returns an error message if the csv row does not fit columns, None otherwise"
+    if len(row) != len(columns):
+        return "{} columns expected, {} found".format(len(columns), len(row))
+    # files are decoded with errors="replace", bytes that are not utf-8 end up as U+FFFD
+    if any("\ufffd" in value for value in row):
+        return "invalid utf-8"
+    for value, (name, type_) in zip(row, columns):
+        if value == "":
+            if name in ("id", "hole_id", "x", "y", "z", "depth_"):
+                return "missing {}".format(name)
+            continue
+        if type_ in ("real", "double precision", "integer"):
+            try:
+                number = int(value) if type_ == "integer" else float(value)
+            except ValueError:
+                return "invalid {} '{}' for {}".format(type_, value, name)
+            if name in ("from_", "to_") and number < 0:
+                return "negative {}".format(name)
+            if name == "depth_" and number <= 0:
+                return "depth_ must be positive"
+        elif name == "id" and value in hole_ids:
+            return "duplicated hole id '{}'".format(value)
+        elif name == "hole_id" and value not in hole_ids:
+            return "unknown hole_id '{}'".format(value)
+    return None
+
 
 def find_in_dir(dir_, name):
     for filename in os.listdir(dir_):
@@ -209,7 +270,7 @@ class Project(object):
                 ):
                     cur.execute(
                         statement.replace("$SRID", str(srid)).replace(
-                            "$INCLUDE_ELEMENTARY_VOLUME", include_elementary_volume
+                            "$INCLUDE_ELEMENTARY_VOLUME", repr(include_elementary_volume)
                         )
                     )
             con.commit()
@@ -252,9 +313,6 @@ class Project(object):
                     insert into albion.{NAME}(hole_id, from_, to_, {FIELDS})
                     values (%s, %s, %s, {FORMAT})
                 """.format(**table), values)
-                cur.execute("""
-                    refresh materialized view albion.{NAME}_section_geom_cache
-                    """.format(**table))
             con.commit()
         self.vacuum()
 
@@ -273,53 +331,78 @@ class Project(object):
                 """);
             if cur.fetchone():
                 # here goes future upgrades
-                cur.execute("select version from _albion.metadata")
-                if cur.fetchone()[0] == "2.0" and self.__has_cell():
+                cur.execute("select version, srid from _albion.metadata")
+                version, srid = cur.fetchone()
+                if version == "2.0" and self.__has_cell():
                     with open(os.path.join(os.path.dirname(__file__),
                                         "albion_raster.sql")) as f:
                         for statement in f.read().split("\n;\n")[:-1]:
                             cur.execute(statement)
-                cur.execute("UPDATE _albion.metadata SET version = '2.3'")
+                if version != "2.4":
+                    self.__upgrade_data(cur, "_albion_v2_3_to_v2_4.sql", srid)
+                    self.__reload_albion_schema(cur, srid)
+                cur.execute("UPDATE _albion.metadata SET version = '2.4'")
                 con.commit()
+                if version != "2.4":
+                    self.__add_layer_views(srid)
 
             else:
                 cur.execute("select srid from albion.metadata")
                 srid, = cur.fetchone()
                 cur.execute("drop schema if exists albion cascade")
                 # old albion version, we upgrade the data
-                for statement in (
-                    open(os.path.join(os.path.dirname(__file__), "_albion_v1_to_v2.sql"))
-                    .read()
-                    .split("\n;\n")[:-1]
-                ):
-                    cur.execute(statement.replace("$SRID", str(srid)))
+                self.__upgrade_data(cur, "_albion_v1_to_v2.sql", srid)
+                self.__upgrade_data(cur, "_albion_v2_3_to_v2_4.sql", srid)
+                self.__reload_albion_schema(cur, srid)
+                con.commit()
+                self.__add_layer_views(srid)
 
-                include_elementary_volume = open(
-                    os.path.join(
-                        os.path.dirname(__file__), "elementary_volume", "__init__.py"
-                    )
-                ).read()
-                for statement in (
-                    open(os.path.join(os.path.dirname(__file__), "albion.sql"))
-                    .read()
-                    .split("\n;\n")[:-1]
-                ):
-                    cur.execute(
-                        statement.replace("$SRID", str(srid)).replace(
-                            "$INCLUDE_ELEMENTARY_VOLUME", include_elementary_volume
-                        )
-                    )
+                self.vacuum()
 
-                con.commit()
+    def __upgrade_data(self, cur, filename, srid):
+        include_elementary_volume = open(
+            os.path.join(
+                os.path.dirname(__file__), "elementary_volume", "__init__.py"
+            )
+        ).read()
+        for statement in (
+            open(os.path.join(os.path.dirname(__file__), filename))
+            .read()
+            .split("\n;\n")[:-1]
+        ):
+            cur.execute(
+                statement.replace("$SRID", str(srid)).replace(
+                    "$INCLUDE_ELEMENTARY_VOLUME", repr(include_elementary_volume)
+                )
+            )
 
-                cur.execute("select name, fields_definition from albion.layer")
-                tables = [{'NAME': r[0], 'FIELDS_DEFINITION': r[1]} for r in cur.fetchall()]
+    def __reload_albion_schema(self, cur, srid):
+        cur.execute("drop schema if exists albion cascade")
+        include_elementary_volume = open(
+            os.path.join(
+                os.path.dirname(__file__), "elementary_volume", "__init__.py"
+            )
+        ).read()
+        for statement in (
+            open(os.path.join(os.path.dirname(__file__), "albion.sql"))
+            .read()
+            .split("\n;\n")[:-1]
+        ):
+            cur.execute(
+                statement.replace("$SRID", str(srid)).replace(
+                    "$INCLUDE_ELEMENTARY_VOLUME", repr(include_elementary_volume)
+                )
+            )
 
-                for table in tables:
-                    table['SRID'] = str(srid)
-                    self.add_table(table, view_only=True)
+    def __add_layer_views(self, srid):
+        with self.connect() as con:
+            cur = con.cursor()
+            cur.execute("select name, fields_definition from albion.layer")
+            tables = [{'NAME': r[0], 'FIELDS_DEFINITION': r[1]} for r in cur.fetchall()]
 
-                self.vacuum()
+        for table in tables:
+            table['SRID'] = str(srid)
+            self.add_table(table, view_only=True)
 
     def export_sections_obj(self, graph, filename):
 
@@ -458,120 +541,142 @@ class Project(object):
 
 
     def import_data(self, dir_, progress=None):
+        """load the csv files found in dir_ (collar, deviation and interval data)
+
+        files are read client side and streamed in chunks, lines that do not
+        fit the table definition (or are not valid utf-8) are skipped and
+        reported, interval tables are loaded concurrently once holes are
+        committed
 
+        collars and deviations are committed before the interval tables are
+        loaded, each interval table in its own transaction: if the load of an
+        interval file fails, the holes and the tables already loaded stay in
+        the project
+
+        returns the list of errors (file, line and message)
+        """
         progress = progress if progress is not None else DummyProgress()
+        errors = []
         with self.connect() as con:
             cur = con.cursor()
+            cur.execute("select id from _albion.hole")
+            hole_ids = set(id_ for id_, in cur.fetchall())
 
-
-            cur.execute(
-                """
-                copy _albion.hole(id, x, y, z, depth_, date_, comments) from '{}' delimiter ';' csv header
-                """.format(
-                    find_in_dir(dir_, "collar")
-                )
-            )
-
+            errors += self.__copy_csv(cur, find_in_dir(dir_, "collar"), "hole",
+                COLLAR_COLUMNS, hole_ids)
             progress.setPercent(5)
 
-            cur.execute(
-                """
-                copy _albion.deviation(hole_id, from_, dip, azimuth) from '{}' delimiter ';' csv header
-                """.format(
-                    find_in_dir(dir_, "devia")
-                )
-            )
-
+            errors += self.__copy_csv(cur, find_in_dir(dir_, "devia"), "deviation",
+                DEVIATION_COLUMNS, hole_ids)
             progress.setPercent(10)
 
-            cur.execute(
-                """
-                update _albion.hole set geom = albion.hole_geom(id)
-                """
-            )
-
+            self.__desurvey_holes(cur)
+            con.commit()
             progress.setPercent(15)
 
+        definitions = {t['NAME']: t for t in TABLES}
+        files = [(find_in_dir(dir_, name), table,
+                  INTERVAL_COLUMNS + parse_fields_definition(definitions[table]))
+                 for name, table in INTERVAL_FILES if find_in_dir(dir_, name)]
 
-            if find_in_dir(dir_, "avp"):
-                cur.execute(
-                    """
-                    copy _albion.radiometry(hole_id, from_, to_, gamma) from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "avp")
-                    )
-                )
-
-            progress.setPercent(20)
-
-            if find_in_dir(dir_, "formation"):
-                cur.execute(
-                    """
-                    copy _albion.formation(hole_id, from_, to_, code, comments) from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "formation")
-                    )
-                )
-
-            progress.setPercent(25)
-
-            if find_in_dir(dir_, "lithology"):
-                cur.execute(
-                    """
-                    copy _albion.lithology(hole_id, from_, to_, code, comments) from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "lithology")
-                    )
-                )
-
-            progress.setPercent(30)
-
-            if find_in_dir(dir_, "facies"):
-                cur.execute(
-                    """
-                    copy _albion.facies(hole_id, from_, to_, code, comments) from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "facies")
-                    )
-                )
-
-            progress.setPercent(35)
-
-            if find_in_dir(dir_, "resi"):
-                cur.execute(
-                    """
-                    copy _albion.resistivity(hole_id, from_, to_, rho) from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "resi")
-                    )
-                )
-
-            progress.setPercent(40)
-
-            if find_in_dir(dir_, "chemical"):
-                cur.execute(
-                    """
-                    copy _albion.chemical(hole_id, from_, to_, num_sample,
-                        element, thickness, gt, grade, equi, comments)
-                    from '{}' delimiter ';' csv header
-                    """.format(
-                        find_in_dir(dir_, "chemical")
-                    )
-                )
-
-            progress.setPercent(45)
-
+        def load(file_):
+            with self.connect() as con:
+                cur = con.cursor()
+                file_errors = self.__copy_csv(cur, *file_, hole_ids=hole_ids)
+                con.commit()
+                return file_errors
 
-            progress.setPercent(100)
+        with ThreadPoolExecutor(max_workers=max(1, len(files))) as executor:
+            futures = [executor.submit(load, file_) for file_ in files]
+            for done, future in enumerate(as_completed(futures)):
+                errors += future.result()
+                progress.setPercent(15 + 85*(done + 1)/len(futures))
 
+        with self.connect() as con:
+            cur = con.cursor()
+            for table in ["hole", "deviation"] + [table for f, table, c in files]:
+                cur.execute("analyze _albion.{}".format(table))
             con.commit()
 
-        self.vacuum()
+        for error in errors:
+            logger.warning(error)
+        progress.setPercent(100)
+        return errors
+
+    def __copy_csv(self, cur, filename, table, columns, hole_ids):
+        """stream the valid lines of a ';' delimited csv file with header into
+        _albion.table, ids of inserted collars are added to hole_ids
 
-    def triangulate(self, createAlbionRaster):
+        returns the list of errors
+        """
+        errors = []
+        names = [name for name, type_ in columns]
+        data = io.StringIO()
+        writer = csv.writer(data)
+
+        def flush():
+            data.seek(0)
+            cur.copy_expert("copy _albion.{}({}) from stdin with (format csv)".format(
+                table, ", ".join(names)), data)
+            data.seek(0)
+            data.truncate()
+
+        with open(filename, newline="", encoding="utf-8", errors="replace") as f:
+            reader = csv.reader(f, delimiter=";")
+            next(reader, None)
+            nb_rows = 0
+            for row in reader:
+                if not len(row):
+                    continue
+                error = check_row(row, columns, hole_ids)
+                if error is not None:
+                    errors.append("{}:{}: {}".format(filename, reader.line_num, error))
+                    continue
+                if names[0] == "id":
+                    hole_ids.add(row[0])
+                writer.writerow(row)
+                nb_rows += 1
+                if nb_rows % IMPORT_CHUNK_SIZE == 0:
+                    flush()
+            flush()
+        return errors
+
+    def __desurvey_holes(self, cur):
+        "compute the geometries of all holes at once, see albion.hole_geom"
+        cur.execute("select srid from _albion.metadata")
+        srid, = cur.fetchone()
+        cur.execute("select id, x, y, z from _albion.hole")
+        collars = {id_: (x, y, z) for id_, x, y, z in cur.fetchall()}
+        cur.execute("select hole_id, from_, dip, azimuth from _albion.deviation")
+        trajectories = desurvey(collars, cur.fetchall())
+
+        data = io.StringIO()
+        writer = csv.writer(data)
+        for id_ in collars:
+            writer.writerow([id_,
+                binascii.hexlify(linestring_ewkb(trajectories[id_], srid)).decode()
+                if id_ in trajectories else None])
+        data.seek(0)
+        cur.execute("""
+            create temporary table hole_trajectory(
+                id varchar primary key,
+                geom geometry)
+            """)
+        cur.copy_expert("copy hole_trajectory(id, geom) from stdin with (format csv)", data)
+        cur.execute("""
+            update _albion.hole as h
+            set geom = albion.complete_hole_geom(h.id, t.geom, h.x, h.y, h.z, h.depth_)
+            from hole_trajectory as t
+            where t.id=h.id
+            """)
+        cur.execute("drop table hole_trajectory")
+
+    def triangulate(self, createAlbionRaster, incremental=False):
+        """create the cells, if incremental only the cells that changed with
+        holes and named section cuts are replaced (see albion.retriangulate)"""
         with self.connect() as con:
             cur = con.cursor()
-            cur.execute("select albion.triangulate()")
+            cur.execute("select albion.retriangulate()" if incremental else "select albion.triangulate()")
             if createAlbionRaster:
                 with open(os.path.join(os.path.dirname(__file__),
                                     "albion_raster.sql")) as f:
@@ -771,25 +876,30 @@ class Project(object):
                     oc=oc, ci=ci, cutoff=cutoff
                 )
             )
-            cur.execute("refresh materialized view albion.mineralization_section_geom_cache")
             con.commit()
 
 
-    def export_obj(self, graph_id, filename):
+    def volume_union(self, graph_id):
+        """VolumeUnion of the closed volumes of graph_id, volumes (packed
+        meshes) are streamed from a server side cursor and added one at a time"""
+        union = VolumeUnion()
         with self.connect() as con:
-            cur = con.cursor()
+            cur = con.cursor(name="volume_union")
+            cur.itersize = 1000
             cur.execute(
                 """
-                select albion.to_obj(albion.volume_union(st_collectionhomogenize(st_collect(triangulation))))
+                select mesh
                 from albion.volume
-                where graph_id='{}'
-                and albion.is_closed_volume(triangulation)
-                and  albion.volume_of_geom(triangulation) > 1
-                """.format(
-                    graph_id
-                )
-            )
-            open(filename, "w").write(cur.fetchone()[0])
+                where graph_id=%s
+                and closed
+                and volume > 1
+                """, (graph_id,))
+            for mesh, in cur:
+                union.add(mesh)
+        return union
+
+    def export_obj(self, graph_id, filename):
+        open(filename, "w").write(mesh_to_obj(self.volume_union(graph_id).mesh()))
 
     def export_elementary_volume_obj(self, graph_id, cell_ids, outdir, closed_only=False):
         with self.connect() as con:
@@ -798,7 +908,7 @@ class Project(object):
                 """
                 select cell_id, row_number() over(partition by cell_id order by closed desc), obj, closed
                 from (
-                    select cell_id, albion.to_obj(triangulation) as obj, albion.is_closed_volume(triangulation) as closed
+                    select cell_id, albion.mesh_to_obj(mesh) as obj, closed
                     from albion.volume
                     where cell_id in ({}) and graph_id='{}'
                     ) as t
@@ -811,7 +921,7 @@ class Project(object):
                     continue
                 filename = '{}_{}_{}_{}.obj'.format(cell_id, graph_id, "closed" if closed else "opened", i)
                 path = os.path.join(outdir, filename)
-                open(path, "w").write(obj[0])
+                open(path, "w").write(obj)
 
 
     def export_elementary_volume_dxf(self, graph_id, cell_ids, outdir, closed_only=False):
@@ -821,7 +931,7 @@ class Project(object):
                 """
                 select cell_id, row_number() over(partition by cell_id order by closed desc), geom, closed
                 from (
-                    select cell_id, triangulation as geom, albion.is_closed_volume(triangulation) as closed
+                    select cell_id, triangulation as geom, closed
                     from albion.volume
                     where cell_id in ({}) and graph_id='{}'
                     ) as t
@@ -845,44 +955,60 @@ class Project(object):
                     )
                 drawing.save()
 
-    def errors_obj(self, graph_id, filename):
+    def export_elementary_volume_inputs(self, graph_id, outdir, cell_ids=None, sample=None):
+        """dumps the arguments of albion.elementary_volumes for cell_ids (all
+        cells if None) or a random sample of cells, in the format read by
+        elementary_volume.benchmark"""
         with self.connect() as con:
             cur = con.cursor()
             cur.execute(
                 """
-                select albion.to_obj(st_collectionhomogenize(st_collect(triangulation)))
-                from albion.volume
-                where graph_id='{}'
-                and (not albion.is_closed_volume(triangulation) or albion.volume_of_geom(triangulation) <= 1)
-
+                select cell_id, graph_id, st_force3d(geom),
+                    array_to_string(holes, ' '), array_to_string(starts, ' '), array_to_string(ends, ' '),
+                    array_to_string(hole_ids, ' '), array_to_string(node_ids, ' '), array_to_string(node_geoms, ' '),
+                    array_to_string(end_ids, ' '), array_to_string(end_geoms, ' '), array_to_string(end_holes, ' '),
+                    m.srid || ' ' || m.end_node_relative_distance || ' ' || m.end_node_relative_thickness
+                from albion.elementary_volume_input, albion.metadata as m
+                where graph_id=%s
+                {}
+                order by random()
+                {}
                 """.format(
-                    graph_id
-                )
+                    "and cell_id = any(%s)" if cell_ids is not None else "",
+                    "limit %s" if sample is not None else ""
+                ),
+                (graph_id,)
+                + ((list(cell_ids),) if cell_ids is not None else ())
+                + ((int(sample),) if sample is not None else ())
             )
-            open(filename, "w").write(cur.fetchone()[0])
+            for rec in cur.fetchall():
+                path = os.path.join(outdir, '{}_{}.txt'.format(graph_id, rec[0]))
+                # cells without end nodes have null arrays, dumped as empty lines
+                open(path, "w").write('\n'.join('' if v is None else v for v in rec) + '\n')
 
-    def export_dxf(self, graph_id, filename):
+    def errors_obj(self, graph_id, filename):
         with self.connect() as con:
             cur = con.cursor()
             cur.execute(
                 """
-                select albion.volume_union(st_collectionhomogenize(st_collect(triangulation)))
+                select albion.to_obj(st_collectionhomogenize(st_collect(triangulation)))
                 from albion.volume
                 where graph_id='{}'
-                and albion.is_closed_volume(triangulation)
-                and  albion.volume_of_geom(triangulation) > 1
+                and (not closed or volume <= 1)
+
                 """.format(
                     graph_id
                 )
             )
-            drawing = dxf.drawing(filename)
-            m = wkb.loads(bytes.fromhex(cur.fetchone()[0]))
-            for p in m:
-                r = p.exterior.coords
-                drawing.add(
-                    dxf.face3d([tuple(r[0]), tuple(r[1]), tuple(r[2])], flags=1)
-                )
-            drawing.save()
+            open(filename, "w").write(cur.fetchone()[0])
+
+    def export_dxf(self, graph_id, filename):
+        drawing = dxf.drawing(filename)
+        for r in self.volume_union(graph_id).coords():
+            drawing.add(
+                dxf.face3d([tuple(r[0]), tuple(r[1]), tuple(r[2])], flags=1)
+            )
+        drawing.save()
 
     def export_holes_vtk(self, filename):
         with self.connect() as con:
@@ -942,29 +1068,216 @@ class Project(object):
                 )
             drawing.save()
 
-    def create_volumes(self, graph_id):
+    def create_volumes(self, graph_id, progress=None, jobs=1, stats=False):
+        """compute the elementary volumes of every cell for graph_id
+
+        volumes of cells whose inputs did not change since they were computed
+        (for any graph) are copied from _albion.volume_cache
+
+        with jobs > 1 cells are split in batches that are evaluated concurrently
+        on separate connections, results are inserted in a single transaction
+
+        with stats, build statistics of each computed cell are recorded in
+        _albion.volume_stats (see volume_stats_report)
+        """
+        progress = progress if progress is not None else DummyProgress()
         with self.connect() as con:
             cur = con.cursor()
+            cur.execute("delete from albion.volume where graph_id=%s", (graph_id,))
+            self.__build_volumes(cur, graph_id, None, progress, jobs, stats)
+            cur.execute("delete from _albion.dirty_cell where graph_id=%s", (graph_id,))
+            con.commit()
+        progress.setPercent(100)
+
+    @staticmethod
+    def __set_volume_stats(cur, stats):
+        cur.execute("set albion.volume_stats to '{}'".format('on' if stats else 'off'))
+
+    def __build_volumes(self, cur, graph_id, cells, progress, jobs, stats):
+        """insert the volumes of cells (all cells if None) of graph_id, volumes
+        that are not in _albion.volume_cache are computed and cached"""
+        cur.execute(
+            """
+            create temporary table cell_input on commit drop as
+            select cell_id, input_hash
+            from albion.elementary_volume_input
+            where graph_id=%s
+            {}
+            """.format("and cell_id = any(%s)" if cells is not None else ""),
+            (graph_id, cells) if cells is not None else (graph_id,))
+        cur.execute(
+            """
+            insert into _albion.volume_cache_use(graph_id, cell_id, input_hash)
+            select %s, cell_id, input_hash from cell_input
+            on conflict (graph_id, cell_id) do update set input_hash=excluded.input_hash
+            """, (graph_id,))
+
+        cur.execute(
+            """
+            select cell_id from cell_input as i
+            where not exists (select 1 from _albion.volume_cache as c where c.input_hash=i.input_hash)
+            order by cell_id
+            """)
+        missing = [id_ for id_, in cur.fetchall()]
+
+        cur.execute(
+            """
+            create temporary table new_volume(
+                rk serial,
+                cell_id varchar,
+                triangulation geometry,
+                face1 geometry,
+                face2 geometry,
+                face3 geometry
+            ) on commit drop
+            """)
+        if jobs > 1 and len(missing) > 1:
+            self.__compute_volumes_parallel(cur, graph_id, missing, progress, jobs, stats)
+        elif len(missing):
+            self.__set_volume_stats(cur, stats)
             cur.execute(
                 """
-                delete from albion.volume where graph_id='{}'
+                insert into new_volume(cell_id, triangulation, face1, face2, face3)
+                select cell_id, geom, face1, face2, face3
+                from albion.dynamic_volume
+                where graph_id=%s
+                and cell_id = any(%s)
+                and geom is not null
+                """, (graph_id, missing))
+
+        # cells without volume are cached too, volumes are packed as meshes
+        cur.execute(
+            """
+            insert into _albion.volume_cache(input_hash, meshes, face1s, face2s, face3s)
+            select i.input_hash,
+                coalesce(array_agg(albion.to_mesh(n.triangulation) order by n.rk) filter (where n.rk is not null), '{}'),
+                coalesce(array_agg(n.face1 order by n.rk) filter (where n.rk is not null), '{}'),
+                coalesce(array_agg(n.face2 order by n.rk) filter (where n.rk is not null), '{}'),
+                coalesce(array_agg(n.face3 order by n.rk) filter (where n.rk is not null), '{}')
+            from cell_input as i
+            left join new_volume as n on n.cell_id=i.cell_id
+            where i.cell_id = any(%s)
+            group by i.input_hash
+            on conflict do nothing
+            """, (missing,))
+        cur.execute(
+            """
+            insert into _albion.volume(graph_id, cell_id, mesh, face1, face2, face3)
+            select %s, i.cell_id, t.mesh, t.face1, t.face2, t.face3
+            from cell_input as i
+            join _albion.volume_cache as c on c.input_hash=i.input_hash,
+            unnest(c.meshes, c.face1s, c.face2s, c.face3s) as t(mesh, face1, face2, face3)
+            """, (graph_id,))
+        cur.execute("drop table cell_input")
+        cur.execute("drop table new_volume")
+
+    def __compute_volumes_parallel(self, cur, graph_id, cells, progress, jobs, stats):
+        # more batches than jobs to balance the load and get a smooth progress,
+        # batches are interleaved since neighbor ids tend to have similar costs
+        nb_batches = min(len(cells), jobs*VOLUME_BATCHES_PER_JOB)
+        batches = [cells[i::nb_batches] for i in range(nb_batches)]
+
+        def compute(batch):
+            with self.connect() as con:
+                cur = con.cursor()
+                self.__set_volume_stats(cur, stats)
+                # volumes travel as EWKB (bytea), half the size of hex geometries
+                cur.execute(
+                    """
+                    select cell_id, st_asewkb(geom), st_asewkb(face1), st_asewkb(face2), st_asewkb(face3)
+                    from albion.dynamic_volume
+                    where graph_id=%s
+                    and cell_id = any(%s)
+                    and geom is not null
+                    """, (graph_id, batch))
+                return cur.fetchall()
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(compute, batch) for batch in batches]
+            for done, future in enumerate(as_completed(futures)):
+                rows = future.result()
+                if len(rows):
+                    execute_values(cur,
+                        """
+                        insert into new_volume(cell_id, triangulation, face1, face2, face3)
+                        values %s
+                        """, rows,
+                        template="(%s, st_geomfromewkb(%s), st_geomfromewkb(%s), st_geomfromewkb(%s), st_geomfromewkb(%s))")
+                progress.setPercent(100*(done + 1)/len(futures))
+
+    def update_volumes(self, graph_id):
+        """recompute the elementary volumes of the cells of graph_id flagged dirty
+        by changes on nodes, edges or end nodes since the last volume computation
+        """
+        with self.connect() as con:
+            cur = con.cursor()
+            cur.execute(
+                """
+                delete from _albion.volume as v
+                using _albion.dirty_cell as d
+                where v.graph_id=d.graph_id and v.cell_id=d.cell_id
+                and d.graph_id='{}'
                 """.format(
                     graph_id
                 )
             )
+            cur.execute("select cell_id from _albion.dirty_cell where graph_id=%s", (graph_id,))
+            cells = [id_ for id_, in cur.fetchall()]
+            if len(cells):
+                self.__build_volumes(cur, graph_id, cells, None, 1, False)
             cur.execute(
                 """
-                insert into _albion.volume(graph_id, cell_id, triangulation, face1, face2, face3)
-                select graph_id, cell_id, geom, face1, face2, face3
-                from albion.dynamic_volume
-                where graph_id='{}'
-                and geom is not null --not st_isempty(geom)
+                delete from _albion.dirty_cell where graph_id='{}'
                 """.format(
                     graph_id
                 )
             )
             con.commit()
 
+    def volume_stats_report(self, graph_id, nb_cells=10):
+        """summary of the build statistics of graph_id recorded by create_volumes
+        with stats: totals by phase and the most expensive cells"""
+        with self.connect() as con:
+            cur = con.cursor()
+            cur.execute(
+                """
+                select count(1), sum(total_time), sum(parse_time), sum(face_time), sum(tessellation_time),
+                    sum(closing_time), sum(component_time), sum(volume_count), sum(open_volume_count),
+                    sum(triangle_count)
+                from _albion.volume_stats
+                where graph_id='{}'
+                """.format(
+                    graph_id
+                )
+            )
+            count, total, parse, face, tessellation, closing, component, volumes, opened, triangles = cur.fetchone()
+            if not count:
+                return "no volume statistics for graph {}".format(graph_id)
+
+            report = [
+                "graph {}: {} cells, {} volumes ({} open), {} triangles, {:.1f}s".format(
+                    graph_id, count, volumes, opened, triangles, total),
+                "    parse {:.1f}s, faces {:.1f}s, tessellation {:.1f}s, closing {:.1f}s, components {:.1f}s".format(
+                    parse, face, tessellation, closing, component),
+                "most expensive cells:"
+                ]
+            cur.execute(
+                """
+                select cell_id, total_time, node_count, edge_count, end_node_count, volume_count, open_volume_count, triangle_count
+                from _albion.volume_stats
+                where graph_id='{}'
+                order by total_time desc
+                limit {}
+                """.format(
+                    graph_id, int(nb_cells)
+                )
+            )
+            for cell_id, time_, nodes, edges, ends, volumes, opened, triangles in cur.fetchall():
+                report.append(
+                    "    {}: {:.3f}s, {} nodes, {} edges, {} end nodes -> {} volumes ({} open), {} triangles".format(
+                        cell_id, time_, nodes, edges, ends, volumes, opened, triangles))
+            return "\n".join(report)
+
     def create_terminations(self, graph_id):
         with self.connect() as con:
             cur = con.cursor()
@@ -1056,7 +1369,7 @@ class Project(object):
             cur = con.cursor()
             cur.execute("select count(1) from albion.layer where name='{}'".format(table))
             if cur.fetchone()[0]:
-                cur.execute("refresh materialized view albion.{}_section_geom_cache".format(table))
+                cur.execute("select albion.{}_section_geom_cache_refresh()".format(table))
                 con.commit()
 
     def closest_hole_id(self, x, y):
@@ -0,0 +1,23 @@
+from __future__ import print_function
+# coding = utf-8
+
+# fourmy is only installed for the plpython backend, the plugin (project and
+# the mesh functions of elementary_volume) must load without it
+
+if __name__ == "__main__":
+    import sys
+
+    # an import of fourmy now fails as if it was not installed
+    sys.modules['fourmy'] = None
+
+    import albion.elementary_volume
+    import albion.project
+
+    try:
+        list(albion.elementary_volume.elementary_volumes(
+            ['a', 'b', 'c'], [], [], [], [], [], [], [], []))
+    except ImportError:
+        pass
+    else:
+        assert False, "elementary_volumes should need fourmy"
+    print("albion.project loads without fourmy")
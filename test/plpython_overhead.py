@@ -0,0 +1,39 @@
+if __name__ == "__main__":
+
+    from albion.project import Project
+    import os
+    import time
+
+    project = Project("tutorial_test")
+    nb_calls = 100
+
+    with open(os.path.join(os.path.dirname(__file__), '..', 'elementary_volume', '__init__.py')) as f:
+        source = f.read()
+
+    with project.connect() as con:
+        cur = con.cursor()
+
+        # what every call used to do: execute the module source
+        cur.execute("""
+            create or replace function pg_temp.inlined_elementary_volume()
+            returns varchar
+            language plpython3u volatile
+            as
+            $$
+            exec({}, dict())
+            return 'ok'
+            $$
+            """.format(repr(source)))
+        start = time.time()
+        for i in range(nb_calls):
+            cur.execute("select pg_temp.inlined_elementary_volume()")
+        inlined = time.time() - start
+
+        cur.execute("select albion.load_elementary_volume()")
+        start = time.time()
+        for i in range(nb_calls):
+            cur.execute("select albion.to_vtk('MULTILINESTRING((0 0 0,1 1 1))'::geometry)")
+        cached = time.time() - start
+
+        print("inlined source {:.2f}ms per call, cached module {:.2f}ms per call".format(
+            1000*inlined/nb_calls, 1000*cached/nb_calls))
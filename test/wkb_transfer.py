@@ -0,0 +1,83 @@
+if __name__ == "__main__":
+
+    from albion.project import Project
+    import sys
+    import psycopg2
+    import time
+
+    if len(sys.argv) != 3:
+        sys.stderr.write("usage: python -m albion.test.wkb_transfer project_name graph_id\n")
+        exit(1)
+    project_name, graph_id = sys.argv[1:]
+
+    project = Project(project_name)
+    try:
+        con = project.connect()
+    except psycopg2.OperationalError as e:
+        sys.stderr.write("error: cannot connect to project {}: {}\n".format(project_name, e))
+        exit(1)
+
+    with con:
+        cur = con.cursor()
+        cur.execute("select count(1) from albion.graph where id=%s", (graph_id,))
+        if not cur.fetchone()[0]:
+            sys.stderr.write("error: graph {} does not exist in project {}\n".format(graph_id, project_name))
+            exit(1)
+
+        cur.execute("select albion.load_elementary_volume()")
+
+        # baseline: geometries received as EWKT text and parsed, then what
+        # every call of elementary_volumes used to do with its arguments
+        # (receive geometries as hex text and decode them) and what it does now
+        for type_, parse in (
+                ('text', 'wkt.loads(g.split(";", 1)[-1])'),
+                ('geometry', 'wkb.loads(bytes.fromhex(g))'),
+                ('bytea', 'wkb.loads(g)')):
+            cur.execute("""
+                create or replace function pg_temp.parse_{type_}(nodes_ {type_}[], end_geoms_ {type_}[])
+                returns integer
+                language plpython3u immutable
+                as
+                $$
+                from shapely import wkb, wkt
+                return len([{parse} for g in nodes_ + end_geoms_])
+                $$
+                """.format(type_=type_, parse=parse))
+
+        timing = {}
+        for name, query in (
+                ('ewkt', """
+                    select sum(pg_temp.parse_text(
+                        array(select st_asewkt(g) from unnest(node_geoms) as g),
+                        array(select st_asewkt(g) from unnest(coalesce(end_geoms, '{}'::geometry[])) as g)))
+                    from albion.elementary_volume_input where graph_id=%s
+                    """),
+                ('hex', "select sum(pg_temp.parse_geometry(node_geoms, coalesce(end_geoms, '{}'))) from albion.elementary_volume_input where graph_id=%s"),
+                ('bytea', "select sum(pg_temp.parse_bytea(node_wkbs, coalesce(end_wkbs, '{}'))) from albion.elementary_volume_input where graph_id=%s"),
+                ('dynamic_volume', "select count(1) from albion.dynamic_volume where graph_id=%s")):
+            start = time.time()
+            cur.execute(query, (graph_id,))
+            timing[name] = time.time() - start
+        cur.execute("select count(1) from albion.elementary_volume_input where graph_id=%s", (graph_id,))
+        nb_cells, = cur.fetchone()
+        print("volume inputs of {} cells: ewkt {:.2f}ms, hex {:.2f}ms, bytea {:.2f}ms per cell, dynamic_volume {:.2f}ms per cell".format(
+            nb_cells, *[1000*timing[name]/max(nb_cells, 1) for name in ('ewkt', 'hex', 'bytea', 'dynamic_volume')]))
+
+        # metrics of the volumes, previously three functions each receiving the hex triangulation
+        cur.execute("select count(1) from albion.volume where graph_id=%s", (graph_id,))
+        nb_volumes, = cur.fetchone()
+        start = time.time()
+        cur.execute("""
+            select count(albion.is_closed_volume(triangulation)), count(albion.volume_of_geom(triangulation)), count(albion.to_mesh(triangulation))
+            from albion.volume where graph_id=%s
+            """, (graph_id,))
+        hex_ = time.time() - start
+        start = time.time()
+        cur.execute("""
+            select count(m.closed), count(m.volume), count(m.bbox)
+            from albion.volume as v, albion.mesh_metrics(v.mesh) as m
+            where v.graph_id=%s
+            """, (graph_id,))
+        mesh = time.time() - start
+        print("metrics of {} volumes: hex {:.2f}ms, mesh {:.2f}ms per volume".format(
+            nb_volumes, 1000*hex_/max(nb_volumes, 1), 1000*mesh/max(nb_volumes, 1)))
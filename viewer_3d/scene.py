@@ -5,14 +5,14 @@ from builtins import range
 import numpy
 from OpenGL.GL import *
 from OpenGL.GL import shaders
+from OpenGL.arrays import vbo
 
 from qgis.PyQt.QtGui import *
 from qgis.PyQt.QtCore import *
 
-from .utility import computeNormals
-from shapely import wkb
+from .utility import computeNormals, multipointCoords, lineSegments, pickColors
+from ..elementary_volume import from_mesh
 import traceback
-from builtins import bytes
 
 class Scene(QObject):
     
@@ -78,6 +78,14 @@ class Scene(QObject):
                 "volume":None,
                 "volume_section":None,
                 "error":None}
+        # barycentric coordinates of triangle vertices, used by the shader to draw edges
+        self.bary = {
+                "volume":None,
+                "volume_section":None,
+                "error":None}
+
+        # (layer, array name) -> buffer object
+        self.__buffers = {}
 
         self.__labels = []
 
@@ -149,6 +157,30 @@ class Scene(QObject):
             return False
 
 
+    def __bind(self, layer, name, array):
+        """bind the buffer object holding array, it is created on first use (the
+        GL context is current during rendering) and its data are uploaded again
+        only when the array of the layer has been replaced"""
+        buf = self.__buffers.get((layer, name))
+        if buf is None:
+            buf = vbo.VBO(array,
+                target=GL_ELEMENT_ARRAY_BUFFER if name == 'idx' else GL_ARRAY_BUFFER)
+            self.__buffers[(layer, name)] = buf
+        elif buf.data is not array:
+            buf.set_array(array)
+        buf.bind()
+        return buf
+
+    def __unbind(self):
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def deleteBuffers(self):
+        "release the buffer objects, the GL context must be current"
+        for buf in self.__buffers.values():
+            buf.delete()
+        self.__buffers = {}
+
     def highlight(self, layer, color):
         idx = 0
         for b in color[:3]:
@@ -188,10 +220,15 @@ class Scene(QObject):
         if self.__param[layer]:
             if self.__param[layer] != self.__old_param[layer]:
                 self.update(layer)
+            glPushMatrix()
+            glScalef(1., 1., self.__param["z_scale"])
             glLineWidth(8)
-            glColorPointer(4, GL_UNSIGNED_BYTE, 0, self.pick_color[layer])
-            glVertexPointerf(self.vtx[layer])
-            glDrawElementsui(GL_LINES, self.idx[layer])
+            glColorPointer(4, GL_UNSIGNED_BYTE, 0, self.__bind(layer, 'pick_color', self.pick_color[layer]))
+            glVertexPointer(3, GL_FLOAT, 0, self.__bind(layer, 'vtx', self.vtx[layer]))
+            glDrawElements(GL_LINES, self.idx[layer].size, GL_UNSIGNED_INT,
+                self.__bind(layer, 'idx', self.idx[layer]))
+            self.__unbind()
+            glPopMatrix()
         glDisableClientState(GL_COLOR_ARRAY)
         glDisableClientState(GL_VERTEX_ARRAY)
 
@@ -205,9 +242,11 @@ class Scene(QObject):
         if self.__param["graph_id"] != self.__old_param["graph_id"]:
             self.setGraph(self.__param["graph_id"])
 
-        if self.__param["z_scale"] != self.__old_param["z_scale"]:
-            self.setZscale(self.__param["z_scale"])
-
+        # z scale is applied by the modelview matrix, normals are transformed by
+        # its inverse transpose (gl_NormalMatrix) and must be normalized again
+        glPushMatrix()
+        glScalef(1., 1., self.__param["z_scale"])
+        glEnable(GL_NORMALIZE)
 
         glDisable(GL_COLOR_MATERIAL)
         glDisable(GL_LIGHTING)
@@ -223,16 +262,18 @@ class Scene(QObject):
                 glLineWidth(2)
                 glColor4f(*color[layer])
                 if self.vtx[layer] is not None and len(self.vtx[layer]):
-                    glVertexPointerf(self.vtx[layer])
-                    glDrawElementsui(GL_LINES, self.idx[layer])
+                    glVertexPointer(3, GL_FLOAT, 0, self.__bind(layer, 'vtx', self.vtx[layer]))
+                    idx = self.__bind(layer, 'idx', self.idx[layer])
+                    glDrawElements(GL_LINES, self.idx[layer].size, GL_UNSIGNED_INT, idx)
                     glDisableClientState(GL_COLOR_ARRAY)
                     if self.highlighted_idx[layer] is not None:
                         glDisable(GL_DEPTH_TEST)
                         glLineWidth(6)
                         glColor4f(*(numpy.array([.3,.3,.3, 0.]) + color[layer]))
-                        a = numpy.array(self.idx[layer][self.highlighted_idx[layer]])
-                        glDrawElementsui(GL_LINES, a)
+                        # segment of highlighted element, 2 indices of 4 bytes
+                        glDrawElements(GL_LINES, 2, GL_UNSIGNED_INT, idx + 8*self.highlighted_idx[layer])
                         glEnable(GL_DEPTH_TEST)
+                    self.__unbind()
         
         # render volume
         if self.__param["transparency"] > 0.:
@@ -263,11 +304,11 @@ class Scene(QObject):
                 if self.__param[layer] != self.__old_param[layer]:
                     self.update(layer)
                 if self.vtx[layer] is not None and len(self.vtx[layer]):
-                    texcoord = numpy.array([((255,0,0),(0,255,0),(0,0,255))]*len(self.vtx[layer]), dtype=numpy.uint8)
-                    glVertexPointerf(self.vtx[layer])
-                    glColorPointer(3, GL_UNSIGNED_BYTE, 0, texcoord)
-                    glNormalPointerf(self.nrml[layer])
-                    glDrawElementsui(GL_TRIANGLES, self.idx[layer])
+                    glVertexPointer(3, GL_FLOAT, 0, self.__bind(layer, 'vtx', self.vtx[layer]))
+                    glColorPointer(3, GL_UNSIGNED_BYTE, 0, self.__bind(layer, 'bary', self.bary[layer]))
+                    glNormalPointer(GL_FLOAT, 0, self.__bind(layer, 'nrml', self.nrml[layer]))
+                    idx = self.__bind(layer, 'idx', self.idx[layer])
+                    glDrawElements(GL_TRIANGLES, self.idx[layer].size, GL_UNSIGNED_INT, idx)
                     if not self.__useProgram:
                         glDisable(GL_LIGHTING)
                         glDisableClientState(GL_COLOR_ARRAY)
@@ -275,11 +316,12 @@ class Scene(QObject):
                         glLineWidth(2)
                         glEnable(GL_CULL_FACE)
                         glPolygonMode(GL_FRONT,GL_LINE)
-                        glDrawElementsui(GL_TRIANGLES, self.idx[layer])
+                        glDrawElements(GL_TRIANGLES, self.idx[layer].size, GL_UNSIGNED_INT, idx)
                         glPolygonMode(GL_FRONT,GL_FILL)
                         glDisable(GL_CULL_FACE)
                         glEnableClientState(GL_COLOR_ARRAY)
                         glEnable(GL_LIGHTING)
+                    self.__unbind()
 
 
         glDisableClientState(GL_COLOR_ARRAY)
@@ -297,12 +339,14 @@ class Scene(QObject):
                 glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE,  [7., 4., 4., 1.])
                 glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT,  [7., 4., 4., 1.])
                 glColor4f(.7, .4, .4, 1.)
-                glVertexPointerf(self.vtx[layer])
+                glVertexPointer(3, GL_FLOAT, 0, self.__bind(layer, 'vtx', self.vtx[layer]))
                 glDisableClientState(GL_COLOR_ARRAY)
                 glDisable(GL_CULL_FACE)
                 glPolygonMode(GL_FRONT_AND_BACK,  GL_FILL)
-                glNormalPointerf(self.nrml[layer])
-                glDrawElementsui(GL_TRIANGLES, self.idx[layer])
+                glNormalPointer(GL_FLOAT, 0, self.__bind(layer, 'nrml', self.nrml[layer]))
+                glDrawElements(GL_TRIANGLES, self.idx[layer].size, GL_UNSIGNED_INT,
+                    self.__bind(layer, 'idx', self.idx[layer]))
+                self.__unbind()
                 #if not self.__useProgram:
                 #    glDisable(GL_LIGHTING)
                 #    glDisableClientState(GL_COLOR_ARRAY)
@@ -329,13 +373,18 @@ class Scene(QObject):
         if self.__param['section'] != self.__old_param['section']:
             self.update('section')
         if self.vtx['section'] is not None and len(self.vtx['section']) is not None:
-            glVertexPointerf(self.vtx['section'])
-            glDrawElementsui(GL_LINES, self.idx['section'])
+            glVertexPointer(3, GL_FLOAT, 0, self.__bind('section', 'vtx', self.vtx['section']))
+            glDrawElements(GL_LINES, self.idx['section'].size, GL_UNSIGNED_INT,
+                self.__bind('section', 'idx', self.idx['section']))
             glDrawArrays(GL_POINTS, 0, len(self.vtx['section']))
+            self.__unbind()
 
         glMaterialfv(GL_FRONT_AND_BACK, GL_EMISSION,  [0., 0., 0., 1.])
 
-        # render labels
+        glDisable(GL_NORMALIZE)
+        glPopMatrix()
+
+        # render labels, their quads face the camera and are not scaled
         if self.__param['label']:
             if self.__param['label'] != self.__old_param['label']:
                 self.update('label')
@@ -349,9 +398,10 @@ class Scene(QObject):
             glDisable(GL_LIGHT0)
             glDisable(GL_DEPTH_TEST)
             glDisable(GL_TEXTURE_2D)
+            z_scale = self.__param["z_scale"]
             for scatter in self.__labels:
                 pt = scatter['point']
-                point = QVector3D(pt[0], pt[1], pt[2])
+                point = QVector3D(pt[0], pt[1], pt[2]*z_scale)
                 #glColor4f(0, 0, 0, 1)
                 glPointSize(4)
                 glBegin(GL_POINTS)
@@ -361,7 +411,7 @@ class Scene(QObject):
             glEnable(GL_TEXTURE_2D)
             for scatter in self.__labels:
                 pt = scatter['point']
-                point = QVector3D(pt[0], pt[1], pt[2])
+                point = QVector3D(pt[0], pt[1], pt[2]*z_scale)
                 dist = .8*(point-eye).length()/height
                 w = dist*scatter['image'].width()
                 h = dist*scatter['image'].height()
@@ -406,189 +456,129 @@ class Scene(QObject):
                     image.save('/tmp/test.png')
                     scene.render(painter)
                     del painter
-                    scat = {'point': [x+self.__offset[0], y+self.__offset[1], (z+self.__offset[2])*self.__param["z_scale"]], 'image': image}
+                    scat = {'point': [x+self.__offset[0], y+self.__offset[1], z+self.__offset[2]], 'image': image}
                     scat['texture'] = self.__textureBinder(scat['image'])
                     self.__labels.append(scat)
 
             elif layer=='node':
-                cur.execute("""
-                    select array_agg(id), coalesce(st_collect(geom), 'GEOMETRYCOLLECTION EMPTY'::geometry) from albion.node where graph_id='{}'
-                    """.format(self.__param["graph_id"]))
-                res = cur.fetchone()
-                lines = wkb.loads(bytes.fromhex(res[1]))
-                lines_ids = res[0]
-                if lines_ids is None:
+                if not self.__loadLines(layer, cur, """
+                        select id, id as element, 0 as part, geom from albion.node where graph_id='{}'
+                        """.format(self.__param["graph_id"])):
                     return
-                vtx = []
-                idx = []
-                colors = []
-                for line, id_ in zip(lines, lines_ids):
-                    elt = len(idx)
-                    self.idx_to_id_map[layer][elt] = id_
-                    colors += [(elt >> 16 & 0xff, elt >>  8 & 0xff, elt >>  0 & 0xff, 255)]*len(line.coords)
-                    idx += [(i, i+1) for i in range(len(vtx), len(vtx)+len(line.coords)-1)]
-                    vtx += list(line.coords)
-                self.vtx[layer] = numpy.array(vtx, dtype=numpy.float32)
-                if len(vtx):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.array(idx, dtype=numpy.int32)
-                self.pick_color[layer] = numpy.array(colors, dtype=numpy.uint8)
 
             elif layer=='end':
-                cur.execute("""
-                    select 
-                        array_agg(n.id),
-                        coalesce(st_collect(e.geom), 'GEOMETRYCOLLECTION EMPTY'::geometry),
-                        coalesce(st_collect(st_makeline(
-                            st_3dlineinterpolatepoint(n.geom,.5), 
-                            st_3dlineinterpolatepoint(e.geom,.5))), 'GEOMETRYCOLLECTION EMPTY'::geometry)
-                    from albion.end_node as e
-                    join albion.node as n on n.id=e.node_id
-                    where e.graph_id='{}'
-                    """.format(self.__param["graph_id"]))
-                res = cur.fetchone()
-                lines = wkb.loads(bytes.fromhex(res[1]))
-                edges = wkb.loads(bytes.fromhex(res[2]))
-                lines_ids = res[0]
-                if lines_ids is None:
+                if not self.__loadLines(layer, cur, """
+                        select n.id, e.id as element, 0 as part, e.geom
+                        from albion.end_node as e
+                        join albion.node as n on n.id=e.node_id
+                        where e.graph_id='{graph_id}'
+                        union all
+                        select n.id, e.id as element, 1 as part, st_makeline(
+                            st_3dlineinterpolatepoint(n.geom,.5),
+                            st_3dlineinterpolatepoint(e.geom,.5))
+                        from albion.end_node as e
+                        join albion.node as n on n.id=e.node_id
+                        where e.graph_id='{graph_id}'
+                        """.format(graph_id=self.__param["graph_id"])):
                     return
-                vtx = []
-                idx = []
-                colors = []
-                for line, edge, id_ in zip(lines, edges, lines_ids):
-                    elt = len(idx)
-                    self.idx_to_id_map[layer][elt] = id_
-                    colors += [(elt >> 16 & 0xff, elt >>  8 & 0xff, elt >>  0 & 0xff, 255)]*(len(line.coords)+len(edge.coords))
-                    idx += [(i, i+1) for i in range(len(vtx), len(vtx)+len(line.coords)-1)]
-                    vtx += list(line.coords)
-                    idx += [(i, i+1) for i in range(len(vtx), len(vtx)+len(edge.coords)-1)]
-                    vtx += list(edge.coords)
-                self.vtx[layer] = numpy.array(vtx, dtype=numpy.float32)
-                if len(vtx):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.array(idx, dtype=numpy.int32)
-                self.pick_color[layer] = numpy.array(colors, dtype=numpy.uint8)
 
             elif layer=='section':
 
                 cur.execute("""
-                    select coalesce(st_collect(n.geom), 'GEOMETRYCOLLECTION EMPTY'::geometry)
+                    select array_agg(st_npoints(n.geom)), st_asbinary(st_points(st_collect(n.geom)), 'NDR')
                     from albion.section as s
                     join albion.hole as h on s.geom && h.geom and st_intersects(s.geom, st_startpoint(h.geom))
                     join albion.node as n on n.hole_id=h.id
                     where n.graph_id='{}'
                     """.format(self.__param["graph_id"])
                     )
-                lines = wkb.loads(bytes.fromhex(cur.fetchone()[0]))
-                vtx = []
-                idx = []
-                if not len(lines):
+                counts, points = cur.fetchone()
+                if counts is None:
                     return
-                for line in lines:
-                    idx += [(i, i+1) for i in range(len(vtx), len(vtx)+len(line.coords)-1)]
-                    vtx += list(line.coords)
-                vtx = numpy.array(vtx, dtype=numpy.float32)
-                if len(vtx):
-                    vtx += self.__offset
-                    vtx[:,2] *= self.__param['z_scale']
-                self.vtx[layer] = vtx
-                self.idx[layer] = numpy.array(idx, dtype=numpy.int32)
+                self.vtx[layer] = self.__toScene(multipointCoords(points))
+                self.idx[layer] = lineSegments(counts)
 
             elif layer=='edge':
-                cur.execute("""
-                    select array_agg(id), coalesce(st_collect(geom), 'GEOMETRYCOLLECTION EMPTY'::geometry) from albion.edge where graph_id='{}'
-                    """.format(self.__param["graph_id"]))
-                res = cur.fetchone()
-                lines = wkb.loads(bytes.fromhex(res[1]))
-                lines_ids = res[0]
-                if lines_ids is None:
+                if not self.__loadLines(layer, cur, """
+                        select id, id as element, 0 as part, geom from albion.edge where graph_id='{}'
+                        """.format(self.__param["graph_id"])):
                     return
-                vtx = []
-                idx = []
-                colors = []
-                for line, id_ in zip(lines, lines_ids):
-                    new_idx = [(i, i+1) for i in range(len(vtx), len(vtx)+len(line.coords)-1)]
-                    elt = len(idx)
-                    self.idx_to_id_map[layer][elt] = id_
-                    colors += [(elt >> 16 & 0xff, elt >>  8 & 0xff, elt >>  0 & 0xff, 255)]*len(line.coords)
-                    idx += [(i, i+1) for i in range(len(vtx), len(vtx)+len(line.coords)-1)]
-                    vtx += list(line.coords)
-                self.vtx[layer] = numpy.array(vtx, dtype=numpy.float32)
-                if len(vtx):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.array(idx, dtype=numpy.int32)
-                self.pick_color[layer] = numpy.array(colors, dtype=numpy.uint8)
-            
+
             elif layer=='volume':
-                cur.execute("""
-                    select albion.volume_union(st_collectionhomogenize(coalesce(st_collect(triangulation), 'GEOMETRYCOLLECTION EMPTY'::geometry)))
-                    from albion.volume
-                    where graph_id='{}'
-                    and albion.is_closed_volume(triangulation)
-                    and albion.volume_of_geom(triangulation) > 1
-                    """.format(self.__param["graph_id"]))
-                geom = wkb.loads(bytes.fromhex(cur.fetchone()[0]))
-                self.vtx[layer] = numpy.require(numpy.array([tri.exterior.coords[:-1] for tri in geom]).reshape((-1,3)), numpy.float32, 'C')
-                if len(self.vtx[layer]):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.require(numpy.arange(len(self.vtx[layer])).reshape((-1,3)), numpy.int32, 'C')
-                self.nrml[layer] = computeNormals(self.vtx[layer], self.idx[layer])
+                self.__setTriangles(layer, self.__project.volume_union(self.__param["graph_id"]).coords())
 
             elif layer=='volume_section':
                 cur.execute("""
-                    select st_collectionhomogenize(coalesce(st_collect(geom), 'GEOMETRYCOLLECTION EMPTY'::geometry))
+                    select st_asbinary(st_points(st_collect(geom)), 'NDR')
                     from albion.volume_section
                     where graph_id='{}'
                     """.format(self.__param["graph_id"]))
-                geom = wkb.loads(bytes.fromhex(cur.fetchone()[0]))
-                self.vtx[layer] = numpy.require(numpy.array([tri.exterior.coords[:-1] for tri in geom]).reshape((-1,3)), numpy.float32, 'C')
-                if len(self.vtx[layer]):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.require(numpy.arange(len(self.vtx[layer])).reshape((-1,3)), numpy.int32, 'C')
-                self.nrml[layer] = computeNormals(self.vtx[layer], self.idx[layer])
-
+                self.__loadTriangles(layer, cur.fetchone()[0])
 
             elif layer=='error':
                 cur.execute("""
-                    select st_collectionhomogenize(coalesce(st_collect(triangulation), 'GEOMETRYCOLLECTION EMPTY'::geometry))
+                    select mesh
                     from albion.volume
                     where graph_id='{}'
-                    and (not albion.is_closed_volume(triangulation) or albion.volume_of_geom(triangulation) <= 1)
+                    and (not closed or volume <= 1)
                     """.format(self.__param["graph_id"]))
-                geom = wkb.loads(bytes.fromhex(cur.fetchone()[0]))
-                self.vtx[layer] = numpy.require(numpy.array([tri.exterior.coords[:-1] for tri in geom]).reshape((-1,3)), numpy.float32, 'C')
-                if len(self.vtx[layer]):
-                    self.vtx[layer] += self.__offset
-                    self.vtx[layer][:,2] *= self.__param["z_scale"]
-                self.idx[layer] = numpy.require(numpy.arange(len(self.vtx[layer])).reshape((-1,3)), numpy.int32, 'C')
-                self.nrml[layer] = computeNormals(self.vtx[layer], self.idx[layer])
+                meshes = [from_mesh(mesh) for mesh, in cur.fetchall()]
+                self.__setTriangles(layer, numpy.concatenate(
+                    [vertices[triangles] for srid, vertices, triangles in meshes] + [numpy.zeros((0, 3, 3))]))
 
             self.__old_param[layer] = self.__param[layer]
 
+    def __toScene(self, coords):
+        "float32 scene vertices from float64 map coordinates"
+        # offset is applied in double precision, map coordinates are too large for float32
+        return numpy.require(coords + self.__offset, numpy.float32, 'C')
+
+    def __loadLines(self, layer, cur, query):
+        """load the linestrings of query that returns rows (id, element, part, geom)
+
+        lines of the same element are picked together (e.g. the two lines of an
+        end node), elements are identified by the index of their first segment
+
+        returns False if query returns no line
+        """
+        cur.execute("""
+            select array_agg(id order by element, part),
+                array_agg(element order by element, part),
+                array_agg(st_npoints(geom) order by element, part),
+                st_asbinary(st_points(st_collect(geom order by element, part)), 'NDR')
+            from ({}) as t
+            """.format(query))
+        ids, elements, counts, points = cur.fetchone()
+        if ids is None:
+            return False
+
+        counts = numpy.array(counts, dtype=numpy.int64)
+        segments = numpy.maximum(counts - 1, 0)
+        first_segment = numpy.cumsum(segments) - segments
+        new_element = numpy.ones(len(ids), dtype=bool)
+        new_element[1:] = numpy.array(elements[1:]) != numpy.array(elements[:-1])
+        first_line = numpy.maximum.accumulate(numpy.where(new_element, numpy.arange(len(ids)), 0))
+        elt = first_segment[first_line]
+
+        self.vtx[layer] = self.__toScene(multipointCoords(points))
+        self.idx[layer] = lineSegments(counts)
+        self.pick_color[layer] = pickColors(numpy.repeat(elt, counts))
+        self.idx_to_id_map[layer] = {int(e): id_ for e, id_ in zip(elt[new_element], numpy.array(ids)[new_element])}
+        return True
+
+    def __loadTriangles(self, layer, points):
+        "load triangles from the WKB of the points of their (closed) rings"
+        self.__setTriangles(layer, multipointCoords(points).reshape((-1, 4, 3))[:,:3])
+
+    def __setTriangles(self, layer, coords):
+        "load triangles from their (n, 3, 3) coordinates"
+        self.vtx[layer] = self.__toScene(coords.reshape((-1, 3)))
+        self.idx[layer] = numpy.require(numpy.arange(len(self.vtx[layer])).reshape((-1,3)), numpy.int32, 'C')
+        self.nrml[layer] = computeNormals(self.vtx[layer], self.idx[layer])
+        self.bary[layer] = numpy.tile(numpy.eye(3, dtype=numpy.uint8)*255, (len(self.idx[layer]), 1))
+
     def setGraph(self, graph_id):
         for layer in ['node', 'edge', 'volume', 'volume_section', 'section', 'error', 'end']:
             if self.__param[layer] != self.__old_param[layer]:
                 self.update(layer)
         self.__old_param["graph_id"] = graph_id
-
-
-    def setZscale(self, scale):
-        factor = float(scale)/self.__old_param["z_scale"]
-
-        for layer in ['node', 'edge', 'volume', 'volume_section', 'section', 'error', 'end']:
-            if self.vtx[layer] is not None:
-                self.vtx[layer][:,2] *= factor
-                if layer in ['volume', 'volume_section', 'error']:
-                    self.nrml[layer] = computeNormals(self.vtx[layer], self.idx[layer])
-
-        for scatter in self.__labels:
-            scatter['point'][2] *= factor
-
-        self.__old_param["z_scale"] = scale
-
-
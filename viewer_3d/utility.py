@@ -31,3 +31,35 @@ def computeNormals(vtx, idx):
     return nrml/nrmlNorm.reshape(-1,1)
 
 
+def multipointCoords(data):
+    """(n, 3) float64 coordinates of a little endian 3D MULTIPOINT WKB, as
+    returned by st_asbinary(st_points(geom), 'NDR')
+
+    points have a fixed size in the WKB, so coordinates are extracted with a
+    strided view instead of parsing the geometry
+    """
+    if data is None:
+        return numpy.zeros((0, 3))
+    data = numpy.frombuffer(data, dtype=numpy.uint8)
+    # header: byte order, type, number of points (9 bytes)
+    # point: byte order, type, x, y, z (29 bytes)
+    return numpy.ascontiguousarray(data[9:].reshape(-1, 29)[:, 5:]).view('<f8').reshape(-1, 3)
+
+def lineSegments(counts):
+    "(n, 2) vertex indices of the segments of consecutive lines with counts vertices"
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    ends = numpy.cumsum(counts)
+    keep = numpy.ones(ends[-1] if len(ends) else 0, dtype=bool)
+    keep[ends[counts > 0] - 1] = False
+    start = numpy.flatnonzero(keep)
+    return numpy.require(numpy.column_stack((start, start + 1)), numpy.int32, 'C')
+
+def pickColors(elements):
+    "RGBA colors encoding integer elements (24 bits) for picking"
+    elements = numpy.asarray(elements, dtype=numpy.uint32)
+    colors = numpy.full((len(elements), 4), 255, dtype=numpy.uint8)
+    colors[:, 0] = elements >> 16 & 0xff
+    colors[:, 1] = elements >> 8 & 0xff
+    colors[:, 2] = elements & 0xff
+    return colors
+
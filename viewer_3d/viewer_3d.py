@@ -60,6 +60,9 @@ class Viewer3d(QGLWidget):
             self.update()
 
     def resetScene(self, project, resetCamera=True):
+        if self.scene:
+            self.makeCurrent()
+            self.scene.deleteBuffers()
         if project and project.has_hole:
             self.scene = Scene(project, self.__param, self.bindTexture, self)
             if resetCamera: